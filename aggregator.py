@@ -0,0 +1,127 @@
+# aggregator.py
+
+import time
+from datetime import datetime, timedelta, timezone
+
+from config import QUEUE_BATCH_SIZE, QUEUE_BATCH_MAX_WAIT, QUEUE_AGGREGATION_INTERVAL
+from db_pool import pooled_connection
+from query_cache import invalidate_tables
+import status
+from log_utils import get_logger
+
+log = get_logger('aggregator')
+
+# Session-scoped assignment of payloads to batches, so the batch rows and the payload
+# updates are written from the same snapshot
+BATCH_STAGE_TABLE = 'STRL_QUEUE_BATCH_STAGE'
+
+# Payloads are batched per group; CONFIG_ID is part of the group so STRL_QUEUE_MASTER.CONFIG_ID
+# stays exact for priority propagation (active priorities are unique, so it does not split groups)
+BATCH_GROUP = "SOURCE_ID, SCRIPT_ID, PRIORITY, CONFIG_ID"
+
+
+def ensure_batch_stage(cursor):
+    """
+    Creates the session's batch staging table if needed. CREATE is DDL and commits the open
+    transaction, so call this before any writes on the connection.
+    """
+    cursor.execute(f"""
+        CREATE TEMPORARY TABLE IF NOT EXISTS {BATCH_STAGE_TABLE} (
+            PAYLOAD_ID NUMBER, CONFIG_ID NUMBER, SOURCE_ID NUMBER, SCRIPT_ID NUMBER, PRIORITY NUMBER, QUEUE_NAME VARCHAR
+        )
+    """)
+
+
+def stage_batches(cursor, run_tag, batch_size, flush_before):
+    """
+    Assigns released, un-aggregated payloads to batches of `batch_size` per group, in ID order.
+    A trailing partial batch is only packed once its oldest payload was queued before `flush_before`,
+    so small batches are not cut while a group is still filling. Returns the number of payloads staged.
+    """
+    cursor.execute(f"DELETE FROM {BATCH_STAGE_TABLE}")
+    cursor.execute(f"""
+        INSERT INTO {BATCH_STAGE_TABLE} (PAYLOAD_ID, CONFIG_ID, SOURCE_ID, SCRIPT_ID, PRIORITY, QUEUE_NAME)
+        SELECT ID, CONFIG_ID, SOURCE_ID, SCRIPT_ID, PRIORITY,
+               %(run_tag)s || '_' || CONFIG_ID || '_' || BATCH_NO
+        FROM (
+            SELECT ID, {BATCH_GROUP}, COALESCE(QUEUED_DATETIME, LAST_UPDATED_DATETIME) AS QUEUED_AT,
+                   FLOOR((ROW_NUMBER() OVER (PARTITION BY {BATCH_GROUP} ORDER BY ID) - 1) / %(batch_size)s) AS BATCH_NO
+            FROM STRL_PAYLOAD_MASTER
+            WHERE IS_AGGREGATED = 'N' AND IS_QUEUED = 'Y' AND IS_ACTIVE_STATUS = 'Y'
+        )
+        QUALIFY COUNT(*) OVER (PARTITION BY {BATCH_GROUP}, BATCH_NO) = %(batch_size)s
+             OR MIN(QUEUED_AT) OVER (PARTITION BY {BATCH_GROUP}, BATCH_NO) <= %(flush_before)s
+    """, {'run_tag': run_tag, 'batch_size': batch_size, 'flush_before': flush_before})
+    return cursor.rowcount
+
+
+def write_batches(cursor, now):
+    """Inserts one STRL_QUEUE_MASTER row per staged batch. Returns the number of batches."""
+    cursor.execute(f"""
+        INSERT INTO STRL_QUEUE_MASTER (
+            CONFIG_ID, SOURCE_ID, SCRIPT_ID, SOURCE_NAME, QUEUE_NAME, QUEUE_DATE, QUEUE_TYPE, PRIORITY, PROCESS_STATUS,
+            IS_QUEUED, IS_AGGREGATED, IS_PARSED, CREATED_BY, IS_DROPPED, INPUT_DATA_INDEX, RETRY_COUNT
+        )
+        SELECT b.CONFIG_ID, b.SOURCE_ID, b.SCRIPT_ID, MAX(s.SOURCE_NAME), b.QUEUE_NAME, %(now)s, MAX(c.QUEUE_TYPE), b.PRIORITY, %(pending)s,
+               'Y', 'Y', 'N', 'system', 'N', MIN(b.PAYLOAD_ID) || '-' || MAX(b.PAYLOAD_ID), 0
+        FROM {BATCH_STAGE_TABLE} b
+        LEFT JOIN STRL_SOURCE_MASTER s ON s.ID = b.SOURCE_ID
+        LEFT JOIN STRL_QUEUE_CONFIG c ON c.ID = b.CONFIG_ID
+        GROUP BY b.CONFIG_ID, b.SOURCE_ID, b.SCRIPT_ID, b.PRIORITY, b.QUEUE_NAME
+    """, {'now': now, 'pending': status.BATCH_PENDING})
+    return cursor.rowcount
+
+
+def mark_aggregated(cursor, now):
+    """Links every staged payload to its batch and marks it IS_AGGREGATED. Returns the number of payloads."""
+    cursor.execute(f"""
+        UPDATE STRL_PAYLOAD_MASTER p
+        SET QUEUE_MASTER_ID = q.ID, QUEUE_NAME = q.QUEUE_NAME, IS_AGGREGATED = 'Y', LAST_UPDATED_DATETIME = %(now)s
+        FROM {BATCH_STAGE_TABLE} b
+        JOIN STRL_QUEUE_MASTER q ON q.QUEUE_NAME = b.QUEUE_NAME
+        WHERE p.ID = b.PAYLOAD_ID AND p.IS_AGGREGATED = 'N'
+    """, {'now': now})
+    return cursor.rowcount
+
+
+def aggregate_payloads(batch_size=QUEUE_BATCH_SIZE, max_wait=QUEUE_BATCH_MAX_WAIT, now=None):
+    """
+    Packs released payloads into STRL_QUEUE_MASTER batches, in one transaction.
+    Returns (batches written, payloads aggregated).
+    """
+    now = now or datetime.now(timezone.utc)
+    # Batch names are unique per run: STRL_<run timestamp>_<config>_<batch number>
+    run_tag = 'STRL_' + now.strftime('%Y%m%d%H%M%S%f')
+    flush_before = now - timedelta(seconds=max_wait)
+
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        ensure_batch_stage(cursor)
+        staged = stage_batches(cursor, run_tag, batch_size, flush_before)
+        if not staged:
+            log.info("No payloads ready for aggregation")
+            cursor.close()
+            return 0, 0
+        batches = write_batches(cursor, now)
+        aggregated = mark_aggregated(cursor, now)
+        cursor.execute(f"DELETE FROM {BATCH_STAGE_TABLE}")
+        conn.commit()
+        cursor.close()
+
+    invalidate_tables("STRL_QUEUE_MASTER", "STRL_PAYLOAD_MASTER")
+    log.info("Aggregated %d payloads into %d queue batches", aggregated, batches)
+    return batches, aggregated
+
+
+def run_forever(interval=QUEUE_AGGREGATION_INTERVAL):
+    log.info("Queue aggregator started")
+    while True:
+        try:
+            aggregate_payloads()
+        except Exception as e:
+            log.exception("Queue aggregation failed: %s", e)
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    run_forever()
@@ -1,10 +1,22 @@
-from flask import Flask, render_template, request, redirect, url_for, flash
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from config import get_snowflake_connection, SECRET_KEY
+from config import SECRET_KEY, SEARCH_INDEX_WARM_ON_STARTUP, PREFLIGHT_ENABLED
+from db_pool import pooled_connection, get_pool
 from datetime import datetime, timezone
 from forms import LoginForm
-from script_01 import check_duplicate_config, custom_sort_dataframe, assign_priorities, log_priority_changes, update_priorities
-from script_02 import fetch_results_and_update_config
+from pagination import fetch_page, fetch_ranked_page
+import preflight
+from log_utils import get_logger
+import search_index
+import status
+import views
+from query_cache import query_cache, invalidate_tables
+from script_01 import check_duplicate_config, custom_sort_dataframe, assign_priorities, log_priority_changes, query_hash
+from rebalance import request_rebalance, is_rebalance_pending
+from jobs import start_fetch_job, get_job_status, FetchJobRunning
+from script_02 import execution_key
+
+log = get_logger('app')
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = SECRET_KEY
@@ -13,6 +25,9 @@ login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+if SEARCH_INDEX_WARM_ON_STARTUP:
+    search_index.warm_in_background()
+
 class User(UserMixin):
     def __init__(self, email):
         self.id = email
@@ -47,110 +62,127 @@ def logout():
 def authenticate_user(email, password):
     return email.endswith('@sciera.com')
 
-def fetch_data(query):
-    conn = get_snowflake_connection()
-    cursor = conn.cursor()
-    cursor.execute(query)
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    return data
-
 @app.route('/')
 @login_required
 def index():
     return render_template('index.html')
 
+@app.route('/pool_stats')
+@login_required
+def pool_stats():
+    """Connection pool hit/miss/wait counters for this worker process."""
+    return jsonify(get_pool().stats())
+
+def page_args():
+    """Reads the keyset pagination arguments (after/before/page_size) from the query string."""
+    return {
+        'after': request.args.get('after', type=int),
+        'before': request.args.get('before', type=int),
+        'page_size': request.args.get('page_size', type=int),
+    }
+
+def search_filter(search, *columns):
+    """Builds a parameterized `col ILIKE %s OR ...` filter for the given columns."""
+    if not search:
+        return '', ()
+    where = " OR ".join(f"{column} ILIKE %s" for column in columns)
+    return where, (f"%{search}%",) * len(columns)
+
+def list_page(view, search):
+    """
+    One page of a list view. Searches on indexed tables are resolved by the trigram index to a
+    ranked ID list and fetched by primary key; everything else is a keyset page with an ILIKE filter.
+    """
+    args = page_args()
+    if search and search_index.is_indexed(view.table):
+        ranked_ids = search_index.search(view.table, search)
+        return fetch_ranked_page(view, ranked_ids, request.args.get('page', type=int), args['page_size'])
+    where, params = search_filter(search, *search_index.SEARCH_SPECS[view.table].columns)
+    return fetch_page(view, where, params, **args)
+
+@app.route('/cache_stats')
+@login_required
+def cache_stats():
+    """List-page query cache hit/miss counters for this worker process."""
+    return jsonify(query_cache.stats())
+
 @app.route('/source_master', methods=['GET', 'POST'])
 @login_required
 def source_master():
     search = request.args.get('search')
-    query = "SELECT * FROM STRL_SOURCE_MASTER"
-    if search:
-        query += f" WHERE SOURCE_NAME ILIKE '%{search}%' OR ID::TEXT ILIKE '%{search}%'"
-    sources = fetch_data(query)
-    return render_template('source_master.html', sources=sources)
+    page = list_page(views.SOURCE_MASTER_LIST, search)
+    return render_template('source_master.html', sources=page.rows, page=page, search=search)
 
 @app.route('/script_master', methods=['GET', 'POST'])
 @login_required
 def script_master():
     search = request.args.get('search')
-    query = "SELECT * FROM STRL_SCRIPT_MASTER"
-    if search:
-        query += f" WHERE SCRIPT_NAME ILIKE '%{search}%' OR ID::TEXT ILIKE '%{search}%'"
-    scripts = fetch_data(query)
-    return render_template('script_master.html', scripts=scripts)
+    page = list_page(views.SCRIPT_MASTER_LIST, search)
+    return render_template('script_master.html', scripts=page.rows, page=page, search=search)
 
 @app.route('/queue_config', methods=['GET', 'POST'])
 @login_required
 def queue_config():
     search = request.args.get('search')
-    query = "SELECT * FROM STRL_QUEUE_CONFIG"
-    if search:
-        query += f" WHERE SOURCE_NAME ILIKE '%{search}%' OR SCRIPT_ID::TEXT ILIKE '%{search}%'"
-    queue_configs = fetch_data(query)
-    return render_template('queue_config.html', queue_configs=queue_configs)
+    page = list_page(views.QUEUE_CONFIG_LIST, search)
+    return render_template('queue_config.html', queue_configs=page.rows, page=page, search=search,
+                           rebalance_pending=is_rebalance_pending())
 
 @app.route('/queue_master', methods=['GET', 'POST'])
 @login_required
 def queue_master():
     search = request.args.get('search')
-    query = "SELECT * FROM STRL_QUEUE_MASTER"
-    if search:
-        query += f" WHERE QUEUE_NAME ILIKE '%{search}%' OR ID::TEXT ILIKE '%{search}%'"
-    queue_masters = fetch_data(query)
-    return render_template('queue_master.html', queue_masters=queue_masters)
+    page = list_page(views.QUEUE_MASTER_LIST, search)
+    return render_template('queue_master.html', queue_masters=page.rows, page=page, search=search)
 
 
 @app.route('/payload_master', methods=['GET', 'POST'])
 @login_required
 def payload_master():
     search = request.args.get('search')
-    base_query = "SELECT * FROM STRL_PAYLOAD_MASTER"
-    count_query = "SELECT COUNT(*) FROM STRL_PAYLOAD_MASTER"
-    
-    if search:
-        search_filter = f" WHERE QUEUE_NAME ILIKE '%{search}%' OR ID::TEXT ILIKE '%{search}%'"
-        query = base_query + search_filter
-    else:
-        query = base_query
-    
-    payloads = fetch_data(query)
-    total_count = len(payloads)  # Fetch the count of all records
-    
-    return render_template('payload_master.html', payloads=payloads, total_count=total_count)
+    page = list_page(views.PAYLOAD_MASTER_LIST, search)
+    return render_template('payload_master.html', payloads=page.rows, page=page, search=search,
+                           total_count=page.total_count)
 
-@app.route('/fetch_payload')
+@app.route('/fetch_payload', methods=['GET', 'POST'])
+@login_required
 def fetch_payload():
+    """Starts a fetch run in the background and returns its job ID at once."""
     try:
-        # Call the function defined in script_02.py
-        fetch_results_and_update_config()
-        # return "Payload fetched successfully", 200
-        query = "SELECT * FROM STRL_PAYLOAD_MASTER"
-        payloads = fetch_data(query)
-        return render_template('payload_master.html', payloads=payloads)
-    except Exception as e:
-        return str(e), 500
+        job = start_fetch_job()
+    except FetchJobRunning as e:
+        return jsonify({
+            'error': str(e),
+            'job_id': e.job_id,
+            'status_url': url_for('fetch_payload_status', job_id=e.job_id),
+        }), 409
+    return jsonify({
+        'job_id': job.job_id,
+        'status_url': url_for('fetch_payload_status', job_id=job.job_id),
+    }), 202
+
+@app.route('/fetch_payload/<job_id>')
+@login_required
+def fetch_payload_status(job_id):
+    """Progress of a fetch job or any other fetch run, by its run ID: configs done, rows inserted and errors."""
+    job = get_job_status(job_id)
+    if job is None:
+        return jsonify({'error': f"Unknown fetch job {job_id}"}), 404
+    return jsonify(job)
     
 @app.route('/queue_reprocess', methods=['GET', 'POST'])
 @login_required
 def queue_reprocess():
     search = request.args.get('search')
-    query = "SELECT * FROM STRL_QUEUE_REPROCESS"
-    if search:
-        query += f" WHERE CONFIG_ID::TEXT ILIKE '%{search}%' OR SOURCE_ID::TEXT ILIKE '%{search}%'"
-    reprocesses = fetch_data(query)
-    return render_template('queue_reprocess.html', reprocesses=reprocesses)
+    page = list_page(views.QUEUE_REPROCESS_LIST, search)
+    return render_template('queue_reprocess.html', reprocesses=page.rows, page=page, search=search)
 
 @app.route('/priority_log', methods=['GET', 'POST'])
 @login_required
 def priority_log():
     search = request.args.get('search')
-    query = "SELECT * FROM STRL_PRIORITY_LOG"
-    if search:
-        query += f" WHERE CONFIG_ID::TEXT ILIKE '%{search}%'"
-    priority_logs = fetch_data(query)
-    return render_template('priority_log.html', priority_logs=priority_logs)
+    page = list_page(views.PRIORITY_LOG_LIST, search)
+    return render_template('priority_log.html', priority_logs=page.rows, page=page, search=search)
 
 @app.route('/add_source', methods=['GET', 'POST'])
 @login_required
@@ -164,15 +196,15 @@ def add_source():
         created_by = current_user.email
         created_userid = current_user.email.split('@')[0]
         
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO STRL_SOURCE_MASTER (SOURCE_NAME, SOURCE_DOMAIN, DESCRIPTION, MAXCOUNT_PER_DAY, IS_ACTIVE_STATUS, CREATED_BY, CREATED_USERID) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """, (source_name, source_domain, description, maxcount_per_day, is_active_status, created_by, created_userid))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO STRL_SOURCE_MASTER (SOURCE_NAME, SOURCE_DOMAIN, DESCRIPTION, MAXCOUNT_PER_DAY, IS_ACTIVE_STATUS, CREATED_BY, CREATED_USERID) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, (source_name, source_domain, description, maxcount_per_day, is_active_status, created_by, created_userid))
+            conn.commit()
+            invalidate_tables("STRL_SOURCE_MASTER")
+            cursor.close()
         return redirect(url_for('source_master'))
     return render_template('add_source.html')
 
@@ -189,15 +221,15 @@ def add_script():
         is_active_status = request.form['is_active_status']
         dependency_description = request.form['dependency_description']
         
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO STRL_SCRIPT_MASTER (SOURCE_ID, SOURCE_CODE_PATH, SCRIPT_NAME, VERSION, DESCRIPTION, CREATED_BY, IS_ACTIVE_STATUS, DEPENDENCY_DESCRIPTION) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (source_id, source_code_path, script_name, version, description, created_by, is_active_status, dependency_description))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO STRL_SCRIPT_MASTER (SOURCE_ID, SOURCE_CODE_PATH, SCRIPT_NAME, VERSION, DESCRIPTION, CREATED_BY, IS_ACTIVE_STATUS, DEPENDENCY_DESCRIPTION) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, (source_id, source_code_path, script_name, version, description, created_by, is_active_status, dependency_description))
+            conn.commit()
+            invalidate_tables("STRL_SCRIPT_MASTER")
+            cursor.close()
         return redirect(url_for('script_master'))
     return render_template('add_script.html')
 
@@ -230,7 +262,7 @@ def add_queue_config():
 
         is_active_status = request.form.get('is_active_status', 'Y')
         created_by = current_user.email
-        live_process_status = "Assign_priority_pending"
+        live_process_status = status.ASSIGN_PRIORITY_PENDING
 
         # Ensure all parameters are the correct types
         script_id = int(script_id)
@@ -244,80 +276,94 @@ def add_queue_config():
         params = (
             script_id, source_id, source_name, query_string, queue_type, priority, description, 
             frequency, cron_logic, start_date, end_date, is_active_status, 
-            'N', current_utc_timestamp, created_by, current_utc_timestamp, created_by, live_process_status, maxcount_per_day
+            'N', current_utc_timestamp, created_by, current_utc_timestamp, created_by, live_process_status, maxcount_per_day,
+            query_hash(query_string)
         )
 
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
+        # Estimate the query's cost before saving it; queries over the block thresholds are rejected
+        estimate = preflight.estimate_query(query_string) if PREFLIGHT_ENABLED else None
+        if estimate and estimate.status == preflight.BLOCKED:
+            flash(f"Queue config not saved, its query failed the pre-flight check: {estimate.message}", 'danger')
+            return render_template('add_queue_config.html')
 
-        # Insert the new configuration and get the new ID
-        cursor.execute("""
-            INSERT INTO STRL_QUEUE_CONFIG (
-                SCRIPT_ID, SOURCE_ID, SOURCE_NAME, QUERY_STRING, QUEUE_TYPE, PRIORITY, DESCRIPTION, 
-                FREQUENCY, CRON_LOGIC, START_DATE, END_DATE, IS_ACTIVE_STATUS, IS_PRIORITY_UPDATED, 
-                CREATED_DATETIME, CREATED_BY, LAST_UPDATED_DATETIME, UPDATED_BY, LIVE_PROCESS_STATUS,
-                MAXCOUNT_PER_DAY
-            ) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, params)
-
-        # Retrieve the current value of the sequence
-        cursor.execute("SELECT MAX(ID) FROM STRL_QUEUE_CONFIG")
-        config_id = cursor.fetchone()[0]
-
-        # Insert the initial priority log
-        log_params = (
-            config_id, 0, priority, created_by, current_utc_timestamp
-        )
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+
+            # Insert the new configuration and get the new ID
+            cursor.execute("""
+                INSERT INTO STRL_QUEUE_CONFIG (
+                    SCRIPT_ID, SOURCE_ID, SOURCE_NAME, QUERY_STRING, QUEUE_TYPE, PRIORITY, DESCRIPTION, 
+                    FREQUENCY, CRON_LOGIC, START_DATE, END_DATE, IS_ACTIVE_STATUS, IS_PRIORITY_UPDATED, 
+                    CREATED_DATETIME, CREATED_BY, LAST_UPDATED_DATETIME, UPDATED_BY, LIVE_PROCESS_STATUS,
+                    MAXCOUNT_PER_DAY, QUERY_HASH
+                ) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, params)
+
+            # Retrieve the current value of the sequence
+            cursor.execute("SELECT MAX(ID) FROM STRL_QUEUE_CONFIG")
+            config_id = cursor.fetchone()[0]
+            if estimate:
+                preflight.record_estimate(cursor, config_id, estimate)
+
+            # Insert the initial priority log
+            log_params = (
+                config_id, 0, priority, created_by, current_utc_timestamp
+            )
         
-        cursor.execute("""
-            INSERT INTO STRL_PRIORITY_LOG (CONFIG_ID, OLD_PRIORITY, NEW_PRIORITY, UPDATED_BY, UPDATED_DATETIME) 
-            VALUES (%s, %s, %s, %s, %s)
-        """, log_params)
+            cursor.execute("""
+                INSERT INTO STRL_PRIORITY_LOG (CONFIG_ID, OLD_PRIORITY, NEW_PRIORITY, UPDATED_BY, UPDATED_DATETIME) 
+                VALUES (%s, %s, %s, %s, %s)
+            """, log_params)
 
-        # Check existence of the priority
-        if priority == 0:
-            print('Priority is 0')
-            update_priorities()
+            # Check existence of the priority
+            needs_rebalance = False
+            if priority == 0:
+                log.debug('Priority is 0', extra={'config_id': config_id})
+                needs_rebalance = True
 
-        else:
-            print('Priority is not 0')
+            else:
+                log.debug('Priority is not 0', extra={'config_id': config_id})
 
-            # Prepare the query to check if the priority exists in the table
-            query = """
-            SELECT COUNT(*) 
-            FROM STRL_QUEUE_CONFIG 
-            WHERE PRIORITY = %s 
-            AND ID != %s;
-            """
+                # Prepare the query to check if the priority exists in the table
+                query = """
+                SELECT COUNT(*) 
+                FROM STRL_QUEUE_CONFIG 
+                WHERE PRIORITY = %s 
+                AND ID != %s;
+                """
 
-            # Execute the query with the specified priority
-            cursor.execute(query, (priority, config_id))
+                # Execute the query with the specified priority
+                cursor.execute(query, (priority, config_id))
 
-            # Fetch the result
-            result = cursor.fetchone()
-            priority_count = result[0] if result else 0
+                # Fetch the result
+                result = cursor.fetchone()
+                priority_count = result[0] if result else 0
 
-            print(f"Priority count for {priority}: {priority_count}")
+                log.debug("Priority count for %s: %s", priority, priority_count, extra={'config_id': config_id})
 
-            if priority_count > 0:
-                print('Priority seems to be duplicated, hence updating all priorities')
-                update_priorities()
-            else:
-                print('Priority is new to the list, hence added')
+                if priority_count > 0:
+                    log.info('Priority seems to be duplicated, hence updating all priorities', extra={'config_id': config_id})
+                    needs_rebalance = True
+                else:
+                    log.info('Priority is new to the list, hence added', extra={'config_id': config_id})
 
-        # Update all the queue configurations to 'Processing'
-        cursor.execute("""
-            UPDATE STRL_QUEUE_CONFIG 
-            SET LIVE_PROCESS_STATUS = 'Processing';
-        """)
+            # A config with a settled priority is ready to fetch; otherwise the rebalance releases it
+            if not needs_rebalance:
+                status.transition(cursor, status.PROCESSING, [config_id], from_statuses=[status.ASSIGN_PRIORITY_PENDING])
 
-        # Ensure to commit after all operations
-        conn.commit()
+            # Ensure to commit after all operations
+            conn.commit()
+            invalidate_tables("STRL_QUEUE_CONFIG", "STRL_PRIORITY_LOG")
 
-        cursor.close()
-        conn.close()
+            cursor.close()
 
+        # Rebalance in the background once the new config is committed
+        if needs_rebalance:
+            request_rebalance()
+
+        if estimate and estimate.status == preflight.WARN:
+            flash(f"Queue config {config_id} saved with a pre-flight warning: {estimate.message}", 'warning')
         return redirect(url_for('queue_config'))
     
     return render_template('add_queue_config.html')
@@ -344,15 +390,15 @@ def add_queue_master():
         error_details = request.form['error_details']
         retry_count = request.form['retry_count']
         
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO STRL_QUEUE_MASTER (SOURCE_ID, SCRIPT_ID, SOURCE_NAME, QUEUE_NAME, QUEUE_DATE, QUEUE_TYPE, PRIORITY, PROCESS_STATUS, IS_QUEUED, IS_AGGREGATED, IS_PARSED, CREATED_BY, IS_DROPPED, DROPPED_DATE, INPUT_DATA_INDEX, ERROR_DETAILS, RETRY_COUNT) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        """, (source_id, script_id, source_name, queue_name, queue_date, queue_type, priority, process_status, is_queued, is_aggregated, is_parsed, created_by, is_dropped, dropped_date, input_data_index, error_details, retry_count))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO STRL_QUEUE_MASTER (SOURCE_ID, SCRIPT_ID, SOURCE_NAME, QUEUE_NAME, QUEUE_DATE, QUEUE_TYPE, PRIORITY, PROCESS_STATUS, IS_QUEUED, IS_AGGREGATED, IS_PARSED, CREATED_BY, IS_DROPPED, DROPPED_DATE, INPUT_DATA_INDEX, ERROR_DETAILS, RETRY_COUNT) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+            """, (source_id, script_id, source_name, queue_name, queue_date, queue_type, priority, process_status, is_queued, is_aggregated, is_parsed, created_by, is_dropped, dropped_date, input_data_index, error_details, retry_count))
+            conn.commit()
+            invalidate_tables("STRL_QUEUE_MASTER")
+            cursor.close()
         return redirect(url_for('queue_master'))
     return render_template('add_queue_master.html')
 
@@ -368,19 +414,18 @@ def edit_source(id):
         updated_by = current_user.email
         updated_userid = current_user.email.split('@')[0]
         
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE STRL_SOURCE_MASTER 
-            SET SOURCE_NAME=%s, SOURCE_DOMAIN=%s, DESCRIPTION=%s, MAXCOUNT_PER_DAY=%s, IS_ACTIVE_STATUS=%s, UPDATED_BY=%s, UPDATED_USERID=%s, LAST_UPDATED_DATETIME=convert_timezone('UTC', current_timestamp())
-            WHERE ID=%s
-        """, (source_name, source_domain, description, maxcount_per_day, is_active_status, updated_by, updated_userid, id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE STRL_SOURCE_MASTER 
+                SET SOURCE_NAME=%s, SOURCE_DOMAIN=%s, DESCRIPTION=%s, MAXCOUNT_PER_DAY=%s, IS_ACTIVE_STATUS=%s, UPDATED_BY=%s, UPDATED_USERID=%s, LAST_UPDATED_DATETIME=convert_timezone('UTC', current_timestamp())
+                WHERE ID=%s
+            """, (source_name, source_domain, description, maxcount_per_day, is_active_status, updated_by, updated_userid, id))
+            conn.commit()
+            invalidate_tables("STRL_SOURCE_MASTER")
+            cursor.close()
         return redirect(url_for('source_master'))
-    query = f"SELECT * FROM STRL_SOURCE_MASTER WHERE ID={id}"
-    source = fetch_data(query)[0]
+    source = views.fetch_record(views.SOURCE_EDIT, id)
     return render_template('edit_source.html', source=source)
 
 @app.route('/edit_script/<int:id>', methods=['GET', 'POST'])
@@ -396,27 +441,21 @@ def edit_script(id):
         updated_by = current_user.email
         updated_userid = current_user.email.split('@')[0]
         
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE STRL_SCRIPT_MASTER 
-            SET SOURCE_CODE_PATH=%s, SCRIPT_NAME=%s, VERSION=%s, DESCRIPTION=%s, IS_ACTIVE_STATUS=%s, DEPENDENCY_DESCRIPTION=%s, UPDATED_BY=%s, UPDATED_USERID=%s, LAST_UPDATED_DATETIME=convert_timezone('UTC', current_timestamp())
-            WHERE ID=%s
-        """, (source_code_path, script_name, version, description, is_active_status, dependency_description, updated_by, updated_userid, id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE STRL_SCRIPT_MASTER 
+                SET SOURCE_CODE_PATH=%s, SCRIPT_NAME=%s, VERSION=%s, DESCRIPTION=%s, IS_ACTIVE_STATUS=%s, DEPENDENCY_DESCRIPTION=%s, UPDATED_BY=%s, UPDATED_USERID=%s, LAST_UPDATED_DATETIME=convert_timezone('UTC', current_timestamp())
+                WHERE ID=%s
+            """, (source_code_path, script_name, version, description, is_active_status, dependency_description, updated_by, updated_userid, id))
+            conn.commit()
+            invalidate_tables("STRL_SCRIPT_MASTER")
+            cursor.close()
         return redirect(url_for('script_master'))
     
-    query = f"SELECT * FROM STRL_SCRIPT_MASTER WHERE ID={id}"
-    script = fetch_data(query)
-    
-    if script:
-        script = script[0]
-    else:
-        script = {}
+    script = views.fetch_record(views.SCRIPT_EDIT, id) or {}
     
-    print("Fetched script data: ", script)  # Debugging statement
+    log.debug("Fetched script data: %s", script)
     
     return render_template('edit_script.html', script=script)
 
@@ -424,11 +463,10 @@ def edit_script(id):
 @login_required
 def edit_queue_config(id):
     # Fetch existing queue configuration to get the old priority and status
-    query = f"SELECT * FROM STRL_QUEUE_CONFIG WHERE ID={id}"
-    queue_config = fetch_data(query)[0]
-    old_priority = queue_config[6]  # Assuming priority is the 7th column (index 6)
-    old_active_status = queue_config[27]  # Assuming IS_ACTIVE_STATUS is the 28th column (index 27)
-    print(f"Editing config {id}: old_priority={old_priority}, old_active_status={old_active_status}")  # Debugging statement
+    queue_config = views.fetch_record(views.QUEUE_CONFIG_EDIT, id)
+    old_priority = queue_config.priority
+    old_active_status = queue_config.is_active_status
+    log.debug("Editing config %s: old_priority=%s, old_active_status=%s", id, old_priority, old_active_status, extra={'config_id': id})
 
     if request.method == 'POST':
         # Fetch form data
@@ -448,36 +486,55 @@ def edit_queue_config(id):
         updated_by = current_user.email
         current_utc_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
 
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
+        # A changed query is estimated again; the edit is rejected if it is over the block thresholds.
+        # Compared by execution_key rather than QUERY_HASH, which ignores case and so misses literal edits.
+        query_changed = execution_key(query_string) != execution_key(queue_config.query_string)
+        estimate = preflight.estimate_query(query_string) if PREFLIGHT_ENABLED and query_changed else None
+        if estimate and estimate.status == preflight.BLOCKED:
+            flash(f"Queue config not updated, its query failed the pre-flight check: {estimate.message}", 'danger')
+            return render_template('edit_queue_config.html', queue_config=queue_config)
 
-        # Update the queue config
-        cursor.execute("""
-            UPDATE STRL_QUEUE_CONFIG 
-            SET SCRIPT_ID=%s, SOURCE_ID=%s, SOURCE_NAME=%s, QUERY_STRING=%s, QUEUE_TYPE=%s, PRIORITY=%s, 
-                DESCRIPTION=%s, FREQUENCY=%s, CRON_LOGIC=%s, START_DATE=%s, END_DATE=%s, IS_ACTIVE_STATUS=%s, 
-                LAST_UPDATED_DATETIME=CONVERT_TIMEZONE('UTC', CURRENT_TIMESTAMP()), UPDATED_BY=%s, MAXCOUNT_PER_DAY=%s
-            WHERE ID=%s
-        """, (script_id, source_id, source_name, query_string, queue_type, new_priority, description, frequency, cron_logic, start_date, end_date, new_active_status, updated_by, maxcount_per_day, id))
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
 
-        
-        # Check if priority was updated
-        if new_priority != old_priority:
-            cursor.execute("UPDATE STRL_QUEUE_CONFIG SET IS_PRIORITY_UPDATED='Y', LAST_UPDATED_DATETIME = %s WHERE ID=%s", (current_utc_timestamp,id,))
+            # Update the queue config
             cursor.execute("""
-            INSERT INTO STRL_PRIORITY_LOG (CONFIG_ID, OLD_PRIORITY, NEW_PRIORITY, UPDATED_BY, UPDATED_DATETIME) 
-            VALUES (%s, %s, %s, %s, %s)""", (id, old_priority, new_priority, updated_by, current_utc_timestamp))
-            print(f"Priority updated for config {id}: old_priority={old_priority}, new_priority={new_priority}")  # Debugging statement
+                UPDATE STRL_QUEUE_CONFIG 
+                SET SCRIPT_ID=%s, SOURCE_ID=%s, SOURCE_NAME=%s, QUERY_STRING=%s, QUEUE_TYPE=%s, PRIORITY=%s, 
+                    DESCRIPTION=%s, FREQUENCY=%s, CRON_LOGIC=%s, START_DATE=%s, END_DATE=%s, IS_ACTIVE_STATUS=%s, 
+                    LAST_UPDATED_DATETIME=CONVERT_TIMEZONE('UTC', CURRENT_TIMESTAMP()), UPDATED_BY=%s, MAXCOUNT_PER_DAY=%s,
+                    QUERY_HASH=%s
+                WHERE ID=%s
+            """, (script_id, source_id, source_name, query_string, queue_type, new_priority, description, frequency, cron_logic, start_date, end_date, new_active_status, updated_by, maxcount_per_day, query_hash(query_string), id))
+
+        
+            # Check if priority was updated
+            if new_priority != old_priority:
+                cursor.execute("UPDATE STRL_QUEUE_CONFIG SET IS_PRIORITY_UPDATED='Y', LAST_UPDATED_DATETIME = %s WHERE ID=%s", (current_utc_timestamp,id,))
+                cursor.execute("""
+                INSERT INTO STRL_PRIORITY_LOG (CONFIG_ID, OLD_PRIORITY, NEW_PRIORITY, UPDATED_BY, UPDATED_DATETIME) 
+                VALUES (%s, %s, %s, %s, %s)""", (id, old_priority, new_priority, updated_by, current_utc_timestamp))
+                log.info("Priority updated for config %s: old_priority=%s, new_priority=%s", id, old_priority, new_priority, extra={'config_id': id})
+
+            if estimate:
+                preflight.record_estimate(cursor, id, estimate)
+
+            # A changed query has to be pulled again by the next fetch run; an errored config gets a fresh set of retries
+            if query_changed:
+                status.transition(cursor, status.PROCESSING, [id], from_statuses=[status.FETCHED, status.ERROR],
+                                  set_columns={'FETCH_RETRY_COUNT': 0})
     
-        print(f"Config {id} updated as per edit request with priority {new_priority}")  # Debugging statement
+            log.info("Config %s updated as per edit request with priority %s", id, new_priority, extra={'config_id': id})
         
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            invalidate_tables("STRL_QUEUE_CONFIG", "STRL_PRIORITY_LOG")
+            cursor.close()
 
-        # Update priorities after editing a config
-        update_priorities()
+        # Rebalance priorities in the background after editing a config
+        request_rebalance()
 
+        if estimate and estimate.status == preflight.WARN:
+            flash(f"Queue config {id} updated with a pre-flight warning: {estimate.message}", 'warning')
         return redirect(url_for('queue_config'))
 
     return render_template('edit_queue_config.html', queue_config=queue_config)
@@ -486,15 +543,16 @@ def edit_queue_config(id):
 @login_required
 def delete_queue_config(id):
     """Deletes a specific queue configuration."""
-    conn = get_snowflake_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM STRL_QUEUE_CONFIG WHERE ID = %s", (id,))
-    conn.commit()
-    cursor.close()
-    conn.close()
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM STRL_QUEUE_CONFIG WHERE ID = %s", (id,))
+        conn.commit()
+        invalidate_tables("STRL_QUEUE_CONFIG")
+        search_index.remove("STRL_QUEUE_CONFIG", id)
+        cursor.close()
 
-    # Update priorities after deleting a config
-    update_priorities()
+    # Rebalance priorities in the background after deleting a config
+    request_rebalance()
 
     return redirect(url_for('queue_config'))
 
@@ -520,17 +578,16 @@ def edit_queue_master(id):
         error_details = request.form['error_details']
         retry_count = request.form['retry_count']
         
-        conn = get_snowflake_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE STRL_QUEUE_MASTER SET SOURCE_ID=%s, SCRIPT_ID=%s, SOURCE_NAME=%s, QUEUE_NAME=%s, QUEUE_DATE=%s, QUEUE_TYPE=%s, PRIORITY=%s, PROCESS_STATUS=%s, IS_QUEUED=%s, IS_AGGREGATED=%s, IS_PARSED=%s, CREATED_BY=%s, IS_DROPPED=%s, DROPPED_DATE=%s, INPUT_DATA_INDEX=%s, ERROR_DETAILS=%s, RETRY_COUNT=%s, LAST_UPDATED_DATETIME=convert_timezone('UTC', current_timestamp()) WHERE ID=%s
-        """, (source_id, script_id, source_name, queue_name, queue_date, queue_type, priority, process_status, is_queued, is_aggregated, is_parsed, created_by, is_dropped, dropped_date, input_data_index, error_details, retry_count, id))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE STRL_QUEUE_MASTER SET SOURCE_ID=%s, SCRIPT_ID=%s, SOURCE_NAME=%s, QUEUE_NAME=%s, QUEUE_DATE=%s, QUEUE_TYPE=%s, PRIORITY=%s, PROCESS_STATUS=%s, IS_QUEUED=%s, IS_AGGREGATED=%s, IS_PARSED=%s, CREATED_BY=%s, IS_DROPPED=%s, DROPPED_DATE=%s, INPUT_DATA_INDEX=%s, ERROR_DETAILS=%s, RETRY_COUNT=%s, LAST_UPDATED_DATETIME=convert_timezone('UTC', current_timestamp()) WHERE ID=%s
+            """, (source_id, script_id, source_name, queue_name, queue_date, queue_type, priority, process_status, is_queued, is_aggregated, is_parsed, created_by, is_dropped, dropped_date, input_data_index, error_details, retry_count, id))
+            conn.commit()
+            invalidate_tables("STRL_QUEUE_MASTER")
+            cursor.close()
         return redirect(url_for('queue_master'))
-    query = f"SELECT * FROM STRL_QUEUE_MASTER WHERE ID={id}"
-    queue_master = fetch_data(query)[0]
+    queue_master = views.fetch_record(views.QUEUE_MASTER_EDIT, id)
     return render_template('edit_queue_master.html', queue_master=queue_master)
 
 
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 import snowflake.connector
 
 def get_snowflake_connection():
@@ -11,6 +14,90 @@ def get_snowflake_connection():
         role = 'ROLE'
     )
 
+# Connection pool settings
+POOL_SIZE = 8  # Maximum number of open warehouse connections per process
+POOL_CHECKOUT_TIMEOUT = 30  # Seconds to wait for a free connection before giving up
+POOL_IDLE_TIMEOUT = 600  # Seconds an idle connection is kept before it is closed
+POOL_HEALTH_CHECK_INTERVAL = 60  # Idle seconds after which a connection is pinged before reuse
+
+# List page settings
+PAGE_SIZE = 100  # Default rows per page on the master list pages
+MAX_PAGE_SIZE = 1000  # Upper bound for the page_size query parameter
+COUNT_CACHE_TTL = 300  # Seconds a table's COUNT(*) total is reused
+QUERY_CACHE_TTL = 60  # Seconds a cached list page is served before it is re-queried
+QUERY_CACHE_MAX_ENTRIES = 500  # Cached pages and totals kept per process
+QUERY_CACHE_MAX_BYTES = 64 * 1024 * 1024  # Approximate memory bound for cached rows
+QUERY_CACHE_VERSION_CHECK_INTERVAL = 5  # Seconds between reads of STRL_TABLE_VERSION: a write from another process reaches cached pages and totals within this long
+
+# Search index settings
+# Tables searched through the in-process trigram index. STRL_PAYLOAD_MASTER is left out by default:
+# at tens of millions of rows the index would not fit in a web worker, so it keeps the ILIKE filter.
+SEARCH_INDEX_TABLES = [
+    'STRL_SOURCE_MASTER', 'STRL_SCRIPT_MASTER', 'STRL_QUEUE_CONFIG', 'STRL_QUEUE_MASTER',
+    'STRL_QUEUE_REPROCESS', 'STRL_PRIORITY_LOG',
+]
+SEARCH_INDEX_REFRESH_INTERVAL = 60  # Seconds between incremental refreshes from LAST_UPDATED_DATETIME
+SEARCH_INDEX_REBUILD_EVERY = 20  # Every Nth refresh is a full rebuild, so rows deleted by other processes drop out
+SEARCH_INDEX_WARM_ON_STARTUP = True  # Build the indexes in the background when the app starts
+
+# Priority rebalancing
+PRIORITY_COMPACTION_RATIO = 2  # Renumber all configs 1..N once the max priority exceeds this multiple of the active count
+PRIORITY_UPDATE_CHUNK_SIZE = 5000  # Changed priorities propagated per UPDATE ... FROM VALUES statement
+REBALANCE_DEBOUNCE_SECONDS = 5  # Quiet period after a config edit before the background rebalance starts
+REBALANCE_MAX_DELAY_SECONDS = 30  # Longest a rebalance is postponed by a steady stream of edits
+REBALANCE_LOCK_PATH = os.path.join(tempfile.gettempdir(), 'strl_rebalance.lock')  # Lock file shared by all worker processes on the host
+
+# Fetch run settings
+FETCH_PUSHDOWN = True  # Build payload rows in the warehouse with INSERT ... SELECT; False forces the client-side path
+FETCH_BATCH_SIZE = 10000  # Rows read and inserted per batch when results are streamed through the client
+FETCH_JOB_HISTORY = 20  # Finished fetch jobs kept in memory for the status endpoint
+FETCH_CONCURRENCY = 4  # Configs fetched at once, one pooled connection each; 1 runs them sequentially on one connection
+FETCH_PUBLISH_SLICE_ROWS = 100000  # Staged rows published and committed per checkpoint, so a resumed run skips finished slices
+FETCH_RUN_HEARTBEAT_INTERVAL = 60  # Seconds between heartbeats of an active fetch run
+FETCH_RUN_STALE_AFTER = 600  # A running fetch run without a heartbeat for this long is treated as interrupted and resumable
+FETCH_LARGE_CONFIG_BYTES = 100 * 1024 ** 3  # Configs whose pre-flight estimate scans at least this much run in a separate lane
+FETCH_LARGE_CONFIG_ROWS = 10000000  # ... or that are estimated to return at least this many rows
+FETCH_LARGE_CONCURRENCY = 1  # Large configs fetched at once, alongside (not instead of) FETCH_CONCURRENCY
+# Default fetch limits, used when neither the config nor its source sets FETCH_TIMEOUT_SECONDS / FETCH_MAX_ROWS /
+# FETCH_MAX_BYTES. A config over a limit has its query cancelled and goes to 'Error'; 0 means no limit.
+FETCH_DEFAULT_TIMEOUT_SECONDS = 3600  # Statement timeout for a config's query
+FETCH_DEFAULT_MAX_ROWS = 50000000  # Rows a config's query may return
+FETCH_DEFAULT_MAX_BYTES = 20 * 1024 ** 3  # Bytes of payload JSON a config's query may produce
+
+# Pre-flight settings
+PREFLIGHT_ENABLED = True  # Estimate a QUERY_STRING's cost when a config is added or its query is edited
+PREFLIGHT_WARN_BYTES = 50 * 1024 ** 3  # Estimated bytes scanned at which the config is saved with a warning
+PREFLIGHT_BLOCK_BYTES = 1024 ** 4  # Estimated bytes scanned at which the config is rejected
+PREFLIGHT_WARN_ROWS = 5000000  # Estimated result rows at which the config is saved with a warning
+PREFLIGHT_BLOCK_ROWS = 100000000  # Estimated result rows at which the config is rejected
+PREFLIGHT_COUNT_TIMEOUT = 30  # Seconds the COUNT(*) probe may run before the row estimate is given up
+
+# Scheduler settings
+SCHEDULER_RELOAD_INTERVAL = 300  # Seconds between reloads of config schedules from STRL_QUEUE_CONFIG
+SCHEDULER_MAX_CONFIGS_PER_RUN = 50  # Due configs fetched per scheduler pass; the rest run on the next pass
+SCHEDULER_SPLAY_SECONDS = 600  # Largest per-config offset added to cron times so shared schedules are staggered
+
+# Quota dispatcher settings
+QUOTA_DISPATCH_INTERVAL = 300  # Seconds between dispatcher passes that release payloads to the queue
+QUOTA_DISPATCH_CHUNK_SIZE = 1000  # Configs handled per UPDATE ... FROM VALUES statement
+QUOTA_SMOOTHING = True  # Accrue each day's MAXCOUNT_PER_DAY evenly over the day instead of releasing it all at midnight
+
+# Queue aggregation settings
+QUEUE_BATCH_SIZE = 1000  # Payloads packed into each STRL_QUEUE_MASTER batch
+QUEUE_BATCH_MAX_WAIT = 3600  # Seconds a partial batch may wait to fill before it is packed anyway
+QUEUE_AGGREGATION_INTERVAL = 300  # Seconds between aggregation passes
+
+# Reprocess settings
+REPROCESS_MAX_RETRIES = 5  # Attempts after which a failed payload, batch or config is no longer retried automatically
+REPROCESS_BACKOFF_SECONDS = 300  # Base retry delay; attempt n waits this times 2^n after the last failure
+REPROCESS_CONCURRENCY = 2  # Errored configs re-fetched at once by the reprocess engine, large ones included
+REPROCESS_INTERVAL = 300  # Seconds between reprocess passes
+
+# Logging settings
+LOG_LEVEL = os.environ.get('STRL_LOG_LEVEL', 'INFO')  # DEBUG adds per-config detail such as full config rows
+LOG_FORMAT = 'json'  # 'json' for one JSON object per line, 'text' for human-readable lines
+LOG_MAX_FIELD_CHARS = 2000  # Longer messages and fields are truncated, so a large payload cannot flood the log
+
 # Secret key for Flask sessions
 SECRET_KEY = 'your_secret_key'
 
@@ -33,3 +120,11 @@ EMAIL_API_KEY = 'email_api_key'
 APP_NAME = 'strl-model'  
 APP_PAGE = 'auto-mailer'  
 EMAIL_TYPE = 'strl-model'  
+
+# Email dispatcher settings
+EMAIL_QUEUE_SIZE = 1000  # Notifications buffered before new ones are dropped
+EMAIL_MAX_RETRIES = 3  # Retries per email after the first failed attempt
+EMAIL_RETRY_BACKOFF = 2  # Seconds before the first retry; doubles on each further retry
+EMAIL_REQUEST_TIMEOUT = 10  # Seconds per email API request
+EMAIL_FLUSH_TIMEOUT = 30  # Seconds to wait for queued emails when a script exits
+EMAIL_DIGEST_MODE = True  # Send one summary email per fetch run instead of one email per config
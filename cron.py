@@ -0,0 +1,119 @@
+# cron.py
+
+from datetime import timedelta
+
+# Field order and bounds of a standard 5-field cron expression
+FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('weekday', 0, 7),
+)
+
+NAMES = {
+    'month': {name: number for number, name in enumerate(
+        ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC'], start=1)},
+    'weekday': {name: number for number, name in enumerate(['SUN', 'MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT'])},
+}
+
+MACROS = {
+    '@hourly': '0 * * * *',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@weekly': '0 0 * * 0',
+    '@monthly': '0 0 1 * *',
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+}
+
+# A schedule with no fire time in this many days (e.g. "0 0 30 2 *") is treated as never firing
+SEARCH_LIMIT_DAYS = 366 * 5
+
+
+class CronError(ValueError):
+    """Raised for a CRON_LOGIC value that is not a valid 5-field cron expression."""
+
+
+def _value(token, field):
+    name, low, high = field
+    token = token.upper()
+    number = NAMES.get(name, {}).get(token)
+    if number is None:
+        try:
+            number = int(token)
+        except ValueError:
+            raise CronError(f"Invalid {name} value {token!r}")
+    if not low <= number <= high:
+        raise CronError(f"{name} value {number} is outside {low}-{high}")
+    return number
+
+
+def parse_field(text, field):
+    """The set of values one cron field matches, e.g. "*/15" -> {0, 15, 30, 45} for minutes."""
+    name, low, high = field
+    values = set()
+    for part in text.split(','):
+        range_part, _, step = part.partition('/')
+        step = int(step) if step else 1
+        if step < 1:
+            raise CronError(f"Invalid step in {name} field {text!r}")
+        if range_part == '*':
+            start, end = low, high
+        elif '-' in range_part:
+            start, end = (_value(token, field) for token in range_part.split('-', 1))
+        else:
+            start = _value(range_part, field)
+            end = high if step > 1 else start
+        if start > end:
+            raise CronError(f"Invalid range in {name} field {text!r}")
+        values.update(range(start, end + 1, step))
+    if name == 'weekday' and 7 in values:
+        values.discard(7)
+        values.add(0)
+    return frozenset(values)
+
+
+class CronExpression:
+    """
+    A parsed 5-field cron expression (minute hour day-of-month month day-of-week), evaluated in UTC.
+    As in standard cron, when both day fields are restricted a day matches if either one does.
+    """
+
+    def __init__(self, expression):
+        self.expression = expression.strip()
+        parts = MACROS.get(self.expression.lower(), self.expression).split()
+        if len(parts) != 5:
+            raise CronError(f"Expected 5 fields in cron expression {expression!r}")
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            parse_field(part, field) for part, field in zip(parts, FIELDS)
+        )
+        self._any_day = parts[2] == '*'
+        self._any_weekday = parts[4] == '*'
+
+    def _day_matches(self, moment):
+        in_days = moment.day in self.days
+        # Python: Monday=0 .. Sunday=6; cron: Sunday=0 .. Saturday=6
+        in_weekdays = (moment.weekday() + 1) % 7 in self.weekdays
+        if self._any_day or self._any_weekday:
+            return in_days and in_weekdays
+        return in_days or in_weekdays
+
+    def next_after(self, moment):
+        """The first fire time strictly after `moment` (a datetime), or None if there is none within the search limit."""
+        candidate = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=SEARCH_LIMIT_DAYS)
+        while candidate <= limit:
+            if candidate.month not in self.months:
+                # Jump to the first minute of the next month
+                year, month = (candidate.year + 1, 1) if candidate.month == 12 else (candidate.year, candidate.month + 1)
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+            elif not self._day_matches(candidate):
+                candidate = candidate.replace(hour=0, minute=0) + timedelta(days=1)
+            elif candidate.hour not in self.hours:
+                candidate = candidate.replace(minute=0) + timedelta(hours=1)
+            elif candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+            else:
+                return candidate
+        return None
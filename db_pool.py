@@ -0,0 +1,240 @@
+# db_pool.py
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from config import (
+    get_snowflake_connection,
+    POOL_SIZE,
+    POOL_CHECKOUT_TIMEOUT,
+    POOL_IDLE_TIMEOUT,
+    POOL_HEALTH_CHECK_INTERVAL,
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection becomes available within the checkout timeout."""
+
+
+class _PooledConnection:
+    __slots__ = ('conn', 'created_at', 'last_used')
+
+    def __init__(self, conn):
+        now = time.monotonic()
+        self.conn = conn
+        self.created_at = now
+        self.last_used = now
+
+
+class ConnectionPool:
+    """
+    A thread-safe pool of warehouse connections.
+
+    - Idle connections are reused (hit) before new ones are opened (miss).
+    - At most `size` connections are open at once; extra callers wait up to `timeout` seconds.
+    - Connections idle longer than `idle_timeout` are closed instead of being reused.
+    - Connections idle longer than `health_check_interval` are pinged before being handed out.
+    """
+
+    def __init__(self, factory, size=POOL_SIZE, timeout=POOL_CHECKOUT_TIMEOUT,
+                 idle_timeout=POOL_IDLE_TIMEOUT, health_check_interval=POOL_HEALTH_CHECK_INTERVAL):
+        self._factory = factory
+        self._size = size
+        self._timeout = timeout
+        self._idle_timeout = idle_timeout
+        self._health_check_interval = health_check_interval
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'timeouts': 0,
+            'evicted_idle': 0,
+            'failed_health_checks': 0,
+        }
+
+    def _close_quietly(self, entry):
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+    def _evict_idle(self, now):
+        """Close idle connections past the idle timeout. Caller must hold the lock."""
+        expired = [entry for entry in self._idle if now - entry.last_used > self._idle_timeout]
+        for entry in expired:
+            self._idle.remove(entry)
+            self._close_quietly(entry)
+            self._stats['evicted_idle'] += 1
+
+    def _is_healthy(self, entry, now):
+        if entry.conn.is_closed():
+            return False
+        if now - entry.last_used < self._health_check_interval:
+            return True
+        try:
+            with entry.conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            return True
+        except Exception:
+            return False
+
+    def checkout(self):
+        """Take a connection from the pool, opening a new one if there is room."""
+        deadline = time.monotonic() + self._timeout
+        waited = False
+        wait_started = None
+
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._evict_idle(now)
+
+                if self._idle:
+                    entry = self._idle.pop()
+                    self._in_use += 1
+                    break
+
+                if self._in_use < self._size:
+                    entry = None
+                    self._in_use += 1
+                    break
+
+                if not waited:
+                    waited = True
+                    wait_started = now
+                    self._stats['waits'] += 1
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._stats['wait_seconds'] += now - wait_started
+                    raise PoolTimeout(f"No connection available after {self._timeout}s (pool size {self._size})")
+                self._cond.wait(remaining)
+
+            if waited:
+                self._stats['wait_seconds'] += time.monotonic() - wait_started
+
+        # Health checks and new connections happen outside the lock
+        try:
+            if entry is not None:
+                if self._is_healthy(entry, time.monotonic()):
+                    with self._cond:
+                        self._stats['hits'] += 1
+                    return entry
+                self._close_quietly(entry)
+                with self._cond:
+                    self._stats['failed_health_checks'] += 1
+
+            entry = _PooledConnection(self._factory())
+            with self._cond:
+                self._stats['misses'] += 1
+            return entry
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def checkin(self, entry, discard=False):
+        """Return a connection to the pool, or close it if it is broken or discarded."""
+        if not discard:
+            try:
+                discard = entry.conn.is_closed()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._close_quietly(entry)
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Check out a connection for the duration of a `with` block."""
+        entry = self.checkout()
+        discard = False
+        try:
+            yield entry.conn
+        except Exception:
+            try:
+                entry.conn.rollback()
+            except Exception:
+                discard = True
+            raise
+        finally:
+            self.checkin(entry, discard=discard)
+
+    def stats(self):
+        """Return a snapshot of pool usage counters."""
+        with self._cond:
+            snapshot = dict(self._stats)
+            snapshot['size'] = self._size
+            snapshot['in_use'] = self._in_use
+            snapshot['idle'] = len(self._idle)
+        return snapshot
+
+    def close_all(self):
+        """Close every idle connection. Checked-out connections are closed on checkin."""
+        with self._cond:
+            while self._idle:
+                self._close_quietly(self._idle.pop())
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the process-wide pool, creating it on first use (and again after a fork)."""
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ConnectionPool(get_snowflake_connection)
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def pooled_connection():
+    """Context manager that checks a connection out of the process-wide pool."""
+    return get_pool().connection()
+
+
+@contextmanager
+def statement_timeout(cursor, seconds):
+    """
+    Caps every statement run on the cursor's session inside the block at `seconds`; the warehouse
+    cancels a statement that runs longer. The parameter is unset afterwards so the pooled connection
+    goes back without it. A falsy `seconds` leaves the session untouched.
+    """
+    if not seconds:
+        yield
+        return
+    cursor.execute("ALTER SESSION SET STATEMENT_TIMEOUT_IN_SECONDS = %s", (int(seconds),))
+    try:
+        yield
+    finally:
+        cursor.execute("ALTER SESSION UNSET STATEMENT_TIMEOUT_IN_SECONDS")
+
+
+def values_relation(rows, columns):
+    """
+    Rows of equal width as an inline relation and its bind parameters, e.g.
+    (SELECT column1 AS A, column2 AS B FROM VALUES (%s, %s), ...), for joining small batches in one statement.
+    """
+    placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(rows))
+    select_list = ", ".join(f"column{i} AS {column}" for i, column in enumerate(columns, 1))
+    params = [value for row in rows for value in row]
+    return f"(SELECT {select_list} FROM VALUES {placeholders})", params
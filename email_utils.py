@@ -1,8 +1,21 @@
 # email_utils.py
 
+import atexit
 import json
+import queue
+import threading
+import time
 import requests
-from config import EMAIL_API_URL, EMAIL_API_KEY, SUBSCRIBER_EMAILS, DEVELOPER_EMAILS
+from config import (
+    EMAIL_API_URL, EMAIL_API_KEY, SUBSCRIBER_EMAILS, DEVELOPER_EMAILS,
+    EMAIL_QUEUE_SIZE, EMAIL_MAX_RETRIES, EMAIL_RETRY_BACKOFF, EMAIL_REQUEST_TIMEOUT, EMAIL_FLUSH_TIMEOUT,
+)
+from log_utils import get_logger
+
+log = get_logger('email_utils')
+
+# One pooled HTTP session for every email request
+_session = requests.Session()
 
 def sending_email_api(mail_subject, mail_content, to_email_addresses):
     mail_content = mail_content.replace('"', '\"')
@@ -21,13 +34,114 @@ def sending_email_api(mail_subject, mail_content, to_email_addresses):
         'Content-Type': 'application/json',
         'x-api-key': EMAIL_API_KEY
     }
-    response = requests.post(EMAIL_API_URL, headers=headers, data=json_data)
+    response = _session.post(EMAIL_API_URL, headers=headers, data=json_data, timeout=EMAIL_REQUEST_TIMEOUT)
+    response.raise_for_status()
     return response.text
 
-def notify_subscribers(subject, message):
-    response = sending_email_api(subject, message, SUBSCRIBER_EMAILS)
-    print("Notification sent to subscribers. Response:", response)
+class EmailDispatcher:
+    """
+    Sends emails from an in-process queue on a background thread, so callers never wait on delivery.
+    Failed sends are retried with exponential backoff (EMAIL_RETRY_BACKOFF * 2**attempt seconds).
+    """
+
+    def __init__(self, max_retries=EMAIL_MAX_RETRIES, backoff=EMAIL_RETRY_BACKOFF, queue_size=EMAIL_QUEUE_SIZE):
+        self._max_retries = max_retries
+        self._backoff = backoff
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._thread_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-dispatcher', daemon=True)
+                self._thread.start()
+
+    def send(self, subject, message, to_email_addresses):
+        """Queues an email and returns immediately. Returns False if the queue is full and the email was dropped."""
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((subject, message, to_email_addresses))
+            return True
+        except queue.Full:
+            log.error("Email queue full, dropping notification: %s", subject)
+            return False
+
+    def _deliver(self, subject, message, to_email_addresses):
+        for attempt in range(self._max_retries + 1):
+            try:
+                response = sending_email_api(subject, message, to_email_addresses)
+                log.info("Notification '%s' sent. Response: %s", subject, response)
+                return
+            except requests.RequestException as e:
+                if attempt == self._max_retries:
+                    log.error("Giving up on notification '%s' after %d attempts: %s", subject, attempt + 1, e)
+                    return
+                delay = self._backoff * (2 ** attempt)
+                log.warning("Sending notification '%s' failed (%s), retrying in %ss", subject, e, delay)
+                time.sleep(delay)
+
+    def _run(self):
+        while True:
+            subject, message, to_email_addresses = self._queue.get()
+            try:
+                self._deliver(subject, message, to_email_addresses)
+            except Exception as e:
+                log.exception("Unexpected error sending notification '%s': %s", subject, e)
+            finally:
+                self._queue.task_done()
+
+    def flush(self, timeout=EMAIL_FLUSH_TIMEOUT):
+        """Waits up to `timeout` seconds for queued emails to be sent. Returns True if the queue drained."""
+        deadline = time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+dispatcher = EmailDispatcher()
+atexit.register(dispatcher.flush)
+
+class EmailDigest:
+    """Collects a run's per-config notifications and sends one summary email per recipient list."""
+
+    def __init__(self, title):
+        self.title = title
+        self._lock = threading.Lock()
+        self._subscriber_lines = []
+        self._developer_lines = []
+
+    def add_subscriber_message(self, subject, message):
+        with self._lock:
+            self._subscriber_lines.append(f"<b>{subject}</b>: {message}")
+
+    def add_developer_message(self, subject, message):
+        with self._lock:
+            self._developer_lines.append(f"<b>{subject}</b>: {message}")
+
+    def send(self):
+        """Queues the summary emails; lists with nothing to report are skipped."""
+        with self._lock:
+            subscriber_lines, self._subscriber_lines = self._subscriber_lines, []
+            developer_lines, self._developer_lines = self._developer_lines, []
+        if subscriber_lines:
+            dispatcher.send(f"{self.title}: {len(subscriber_lines)} updates", "<br>".join(subscriber_lines), SUBSCRIBER_EMAILS)
+        if developer_lines:
+            dispatcher.send(f"{self.title}: {len(developer_lines)} errors", "<br>".join(developer_lines), DEVELOPER_EMAILS)
+
+def notify_subscribers(subject, message, digest=None):
+    if digest is not None:
+        digest.add_subscriber_message(subject, message)
+        return
+    dispatcher.send(subject, message, SUBSCRIBER_EMAILS)
+    log.info("Notification queued for subscribers: %s", subject)
 
-def notify_developers(subject, message):
-    response = sending_email_api(subject, message, DEVELOPER_EMAILS)
-    print("Notification sent to developers. Response:", response)
+def notify_developers(subject, message, digest=None):
+    if digest is not None:
+        digest.add_developer_message(subject, message)
+        return
+    dispatcher.send(subject, message, DEVELOPER_EMAILS)
+    log.info("Notification queued for developers: %s", subject)
@@ -0,0 +1,151 @@
+# jobs.py
+
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from config import FETCH_JOB_HISTORY
+from db_pool import pooled_connection
+import run_ledger
+from run_ledger import active_run_id
+from script_02 import fetch_results_and_update_config
+
+
+class FetchJobRunning(Exception):
+    """
+    Raised when a fetch is requested while another fetch run is still active, whether a job in this
+    process or a run started elsewhere, e.g. by the scheduler or another web worker.
+    """
+
+    def __init__(self, job_id):
+        super().__init__(f"Fetch run {job_id} is already running")
+        self.job_id = job_id
+
+
+class FetchJob:
+    """
+    Progress of one background fetch run in the process that started it. The job ID is also the run's
+    RUN_ID in the ledger, which is what other processes report from (see get_job_status).
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self.status = 'queued'
+        self.created_at = datetime.now(timezone.utc)
+        self.started_at = None
+        self.finished_at = None
+        self.configs_total = 0
+        self.configs_done = 0
+        self.rows_inserted = 0
+        self.duplicates_skipped = 0
+        self.errors = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_active(self):
+        return self.status in ('queued', 'running')
+
+    # Progress hooks called by fetch_results_and_update_config
+    def start(self, configs_total):
+        with self._lock:
+            self.configs_total = configs_total
+
+    def config_done(self, result):
+        with self._lock:
+            self.configs_done += 1
+            self.rows_inserted += result.get('rows') or 0
+            self.duplicates_skipped += result.get('duplicates') or 0
+            if result.get('error'):
+                self.errors.append({'config_id': result.get('config_id'), 'error': result['error']})
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'job_id': self.job_id,
+                'status': self.status,
+                'created_at': self.created_at.isoformat(),
+                'started_at': self.started_at.isoformat() if self.started_at else None,
+                'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+                'configs_total': self.configs_total,
+                'configs_done': self.configs_done,
+                'rows_inserted': self.rows_inserted,
+                'duplicates_skipped': self.duplicates_skipped,
+                'errors': list(self.errors),
+            }
+
+
+# A single worker means at most one fetch run executes in this process at a time
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='fetch-job')
+_jobs = OrderedDict()
+_jobs_lock = threading.Lock()
+
+
+def _run_fetch_job(job):
+    job.status = 'running'
+    job.started_at = datetime.now(timezone.utc)
+    try:
+        fetch_results_and_update_config(progress=job, run_id=job.job_id)
+        job.status = 'succeeded'
+    except Exception as e:
+        with job._lock:
+            job.errors.append({'config_id': None, 'error': str(e)})
+        job.status = 'failed'
+    finally:
+        job.finished_at = datetime.now(timezone.utc)
+
+
+def start_fetch_job():
+    """
+    Queues a fetch run on the background executor and returns its FetchJob straight away. Refuses with
+    FetchJobRunning while a job in this process or a fetch run in any other process is still active;
+    FetchRun.start repeats the cross-process check atomically when the job actually begins.
+    """
+    with _jobs_lock:
+        for job in _jobs.values():
+            if job.is_active:
+                raise FetchJobRunning(job.job_id)
+
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            run_id = active_run_id(cursor)
+            cursor.close()
+        if run_id:
+            raise FetchJobRunning(run_id)
+
+        job = FetchJob(uuid.uuid4().hex)
+        _jobs[job.job_id] = job
+        # Keep only the most recent jobs for the status endpoint
+        while len(_jobs) > FETCH_JOB_HISTORY:
+            _jobs.popitem(last=False)
+
+    _executor.submit(_run_fetch_job, job)
+    return job
+
+
+def get_job(job_id):
+    """Returns the FetchJob with this ID, or None if it is unknown or has aged out."""
+    with _jobs_lock:
+        return _jobs.get(job_id)
+
+
+# Ledger run statuses as reported by the status endpoint
+_RUN_STATUSES = {run_ledger.RUNNING: 'running', run_ledger.COMPLETED: 'succeeded', run_ledger.FAILED: 'failed'}
+
+
+def get_job_status(job_id):
+    """
+    Status dict of a fetch job or run, whichever worker started it. Progress comes from the run ledger;
+    a job of this process that has not reached the ledger yet (still queued, or refused at start) is
+    reported from memory. Returns None if neither knows the ID.
+    """
+    progress = run_ledger.run_progress(job_id)
+    job = get_job(job_id)
+    if progress is None:
+        return job.to_dict() if job else None
+    progress['job_id'] = job_id
+    progress['status'] = _RUN_STATUSES.get(progress['status'], progress['status'])
+    if job is not None:
+        progress['created_at'] = job.created_at.isoformat()
+    return progress
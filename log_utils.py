@@ -0,0 +1,142 @@
+# log_utils.py
+
+import contextvars
+import json
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from config import LOG_LEVEL, LOG_FORMAT, LOG_MAX_FIELD_CHARS
+
+ROOT_LOGGER = 'strl'
+
+# Fields attached to every record logged inside log_context(); ThreadPoolExecutor workers do not
+# inherit them, so code running on a worker opens its own context.
+_context = contextvars.ContextVar('strl_log_context', default={})
+
+# Attributes every LogRecord has; anything else on a record came from `extra=` and is logged as a field
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+
+def truncate(value, limit=LOG_MAX_FIELD_CHARS):
+    """
+    Cuts long values down to `limit` characters, noting how much was dropped. Lists, dicts and other
+    objects are measured by their JSON form and, when too long, replaced by that form cut short.
+    """
+    if not limit or value is None or isinstance(value, (bool, int, float)):
+        return value
+    if isinstance(value, str):
+        text = value
+    else:
+        try:
+            text = json.dumps(value, default=str)
+        except ValueError:  # e.g. a circular reference
+            text = str(value)
+    if len(text) > limit:
+        return f"{text[:limit]}... (+{len(text) - limit} chars)"
+    return value
+
+
+class ContextFilter(logging.Filter):
+    """Copies the current log_context() fields onto each record."""
+
+    def filter(self, record):
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Passes only the first of every `sample` records logged from the same call site with
+    `extra={'sample': n}`, and counts what was skipped. Records without `sample` always pass.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        sample = getattr(record, 'sample', None)
+        if not sample or sample <= 1:
+            return True
+        key = (record.name, record.pathname, record.lineno)
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % sample:
+            return False
+        record.sampled = f"1 in {sample}"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, context fields and any `extra=` fields."""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': truncate(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = truncate(value)
+        if record.exc_info:
+            entry['exception'] = truncate(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local runs, with the same context fields appended."""
+
+    def format(self, record):
+        fields = " ".join(f"{key}={truncate(value)}" for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        line = f"{self.formatTime(record)} {record.levelname} {record.name}: {truncate(record.getMessage())}"
+        if fields:
+            line += f" [{fields}]"
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """Sets up the 'strl' logger once per process: one stdout handler, the context and sampling filters."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        handler = logging.StreamHandler(stream or sys.stdout)
+        handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter())
+        handler.addFilter(ContextFilter())
+        handler.addFilter(SamplingFilter())
+        logger = logging.getLogger(ROOT_LOGGER)
+        logger.addHandler(handler)
+        logger.setLevel(level)
+        logger.propagate = False
+        _configured = True
+
+
+def get_logger(name):
+    """Logger for a module, e.g. get_logger('script_02'). Use %-style arguments so messages are only built when emitted."""
+    configure()
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+@contextmanager
+def log_context(**fields):
+    """Adds fields (e.g. run_id, config_id) to every record logged inside the block on this thread."""
+    token = _context.set({**_context.get(), **fields})
+    try:
+        yield
+    finally:
+        _context.reset(token)
@@ -0,0 +1,9 @@
+-- Persisted hash of the normalized QUERY_STRING so duplicate detection can use
+-- an equality match on (SOURCE_ID, SCRIPT_ID, QUERY_HASH) instead of ILIKE.
+-- Must stay in sync with script_01.normalize_query / query_hash.
+
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS QUERY_HASH VARCHAR(64);
+
+UPDATE STRL_QUEUE_CONFIG
+SET QUERY_HASH = SHA2(LOWER(TRIM(REGEXP_REPLACE(QUERY_STRING, '\\s+', ' '))), 256)
+WHERE QUERY_STRING IS NOT NULL;
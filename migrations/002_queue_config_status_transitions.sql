@@ -0,0 +1,12 @@
+-- Time of the last LIVE_PROCESS_STATUS transition, stamped by status.transition.
+
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS LIVE_PROCESS_STATUS_UPDATED_DATETIME TIMESTAMP_NTZ;
+
+UPDATE STRL_QUEUE_CONFIG
+SET LIVE_PROCESS_STATUS_UPDATED_DATETIME = LAST_UPDATED_DATETIME
+WHERE LIVE_PROCESS_STATUS_UPDATED_DATETIME IS NULL;
+
+-- Normalize the one spelling variant the old code wrote so guarded transitions match it
+UPDATE STRL_QUEUE_CONFIG
+SET LIVE_PROCESS_STATUS = 'Assign_priority_pending'
+WHERE LIVE_PROCESS_STATUS = 'Assign_Priority_Pending';
@@ -0,0 +1,9 @@
+-- Stable hash of each payload's canonical JSON so a re-fetch only inserts payloads not
+-- already loaded for the config. Must stay in sync with script_02.publish_staged_payloads.
+
+ALTER TABLE STRL_PAYLOAD_MASTER ADD COLUMN IF NOT EXISTS PAYLOAD_HASH VARCHAR(64);
+
+UPDATE STRL_PAYLOAD_MASTER
+SET PAYLOAD_HASH = SHA2(TO_JSON(PARSE_JSON(PAYLOAD_INPUT)), 256)
+WHERE PAYLOAD_HASH IS NULL
+  AND PAYLOAD_INPUT IS NOT NULL;
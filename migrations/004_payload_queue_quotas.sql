@@ -0,0 +1,6 @@
+-- When each payload was released to the queue, so the dispatcher can count today's usage
+-- against MAXCOUNT_PER_DAY, and the projected date each config's backlog will be queued by.
+
+ALTER TABLE STRL_PAYLOAD_MASTER ADD COLUMN IF NOT EXISTS QUEUED_DATETIME TIMESTAMP_NTZ;
+
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS PROJECTED_COMPLETION_DATE DATE;
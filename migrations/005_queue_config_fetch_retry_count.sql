@@ -0,0 +1,4 @@
+-- Consecutive failed re-fetches of an errored config by the reprocess engine, used for its
+-- exponential backoff and retry cap. Reset to 0 when a re-fetch succeeds.
+
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS FETCH_RETRY_COUNT NUMBER DEFAULT 0;
@@ -0,0 +1,31 @@
+-- Run ledger for fetch runs: one row per run with a heartbeat, and one checkpoint per config
+-- recording how far its payloads got, so an interrupted run can be resumed by the next one.
+
+CREATE TABLE IF NOT EXISTS STRL_FETCH_RUN (
+    RUN_ID VARCHAR(32) NOT NULL PRIMARY KEY,
+    STATUS VARCHAR(20) NOT NULL,
+    CONFIGS_TOTAL NUMBER DEFAULT 0,
+    STARTED_DATETIME TIMESTAMP_NTZ,
+    HEARTBEAT_DATETIME TIMESTAMP_NTZ,
+    FINISHED_DATETIME TIMESTAMP_NTZ
+);
+
+CREATE TABLE IF NOT EXISTS STRL_FETCH_RUN_CONFIG (
+    RUN_ID VARCHAR(32) NOT NULL,
+    CONFIG_ID NUMBER NOT NULL,
+    PHASE VARCHAR(20) NOT NULL,
+    ROWS_FETCHED NUMBER DEFAULT 0,
+    ROW_OFFSET NUMBER DEFAULT 0,
+    ROWS_INSERTED NUMBER DEFAULT 0,
+    UPDATED_DATETIME TIMESTAMP_NTZ,
+    PRIMARY KEY (RUN_ID, CONFIG_ID)
+);
+
+-- Query results waiting to be published to STRL_PAYLOAD_MASTER. Transient (no fail-safe) since the
+-- rows are short-lived; it replaces the per-session temporary stage so staged rows outlive a crash.
+CREATE TRANSIENT TABLE IF NOT EXISTS STRL_PAYLOAD_STAGE (
+    RUN_ID VARCHAR(32) NOT NULL,
+    CONFIG_ID NUMBER NOT NULL,
+    SEQ NUMBER NOT NULL,
+    PAYLOAD_INPUT VARCHAR
+);
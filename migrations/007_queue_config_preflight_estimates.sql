@@ -0,0 +1,9 @@
+-- Pre-flight cost estimates for a config's QUERY_STRING, taken when the config is added or its
+-- query is edited (see preflight.py). The fetch run uses them to put large configs in their own lane.
+
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS ESTIMATED_BYTES NUMBER;
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS ESTIMATED_PARTITIONS NUMBER;
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS ESTIMATED_ROWS NUMBER;
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS PREFLIGHT_STATUS VARCHAR(20);
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS PREFLIGHT_MESSAGE VARCHAR;
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS PREFLIGHT_DATETIME TIMESTAMP_NTZ;
@@ -0,0 +1,11 @@
+-- Fetch limits for a config's query: statement timeout, maximum rows and maximum bytes of payload JSON.
+-- A config's own value wins over its source's; when both are NULL the FETCH_DEFAULT_* settings apply.
+-- A query over a limit is cancelled and its config moved to 'Error' with the limit in ERROR_STRING.
+
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS FETCH_TIMEOUT_SECONDS NUMBER;
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS FETCH_MAX_ROWS NUMBER;
+ALTER TABLE STRL_QUEUE_CONFIG ADD COLUMN IF NOT EXISTS FETCH_MAX_BYTES NUMBER;
+
+ALTER TABLE STRL_SOURCE_MASTER ADD COLUMN IF NOT EXISTS FETCH_TIMEOUT_SECONDS NUMBER;
+ALTER TABLE STRL_SOURCE_MASTER ADD COLUMN IF NOT EXISTS FETCH_MAX_ROWS NUMBER;
+ALTER TABLE STRL_SOURCE_MASTER ADD COLUMN IF NOT EXISTS FETCH_MAX_BYTES NUMBER;
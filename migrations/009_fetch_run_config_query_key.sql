@@ -0,0 +1,5 @@
+-- Key of the query a staged checkpoint was taken for (SHA-256 of script_02.execution_key), so a later
+-- run only resumes a checkpoint whose rows came from the config's current query.
+-- Checkpoints from before this column existed have no key and are never resumed.
+
+ALTER TABLE STRL_FETCH_RUN_CONFIG ADD COLUMN IF NOT EXISTS QUERY_KEY VARCHAR(64);
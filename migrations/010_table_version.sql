@@ -0,0 +1,9 @@
+-- Write counter per table, bumped by every process that writes to the table (query_cache.invalidate_tables).
+-- Web workers compare it with the counter their cached pages were loaded under, so writes made by the
+-- scheduler, the reprocess engine, CLI runs or another worker reach every worker's cache.
+
+CREATE TABLE IF NOT EXISTS STRL_TABLE_VERSION (
+    TABLE_NAME VARCHAR(255) NOT NULL PRIMARY KEY,
+    VERSION NUMBER NOT NULL DEFAULT 0,
+    UPDATED_DATETIME TIMESTAMP_NTZ
+);
@@ -0,0 +1,154 @@
+# pagination.py
+
+import json
+from collections import namedtuple
+
+from config import PAGE_SIZE, MAX_PAGE_SIZE, COUNT_CACHE_TTL
+from db_pool import pooled_connection
+from query_cache import query_cache
+import search_index
+from views import to_rows
+
+# One page of rows plus the keyset cursors needed to move to the neighbouring pages.
+# Ranked search results are paged by number instead, and carry page_number.
+Page = namedtuple('Page', [
+    'rows', 'page_size', 'first_id', 'last_id', 'has_prev', 'has_next', 'total_count', 'page_number'
+], defaults=(None,))
+
+
+def clamp_page_size(page_size):
+    """Keep a requested page size within 1..MAX_PAGE_SIZE, falling back to PAGE_SIZE."""
+    if not page_size or page_size < 1:
+        return PAGE_SIZE
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def build_page_query(table, where='', after=None, before=None, page_size=PAGE_SIZE, columns='*'):
+    """
+    Builds a keyset (seek) query on ID. One extra row is requested so we know whether
+    another page exists in the direction of travel without counting.
+    Returns the SQL, the keyset parameters to append, and whether rows come back reversed.
+    """
+    conditions = [f"({where})"] if where else []
+    params = []
+    reverse = False
+
+    if before is not None:
+        conditions.append("ID < %s")
+        params.append(before)
+        order = "ID DESC"
+        reverse = True
+    else:
+        if after is not None:
+            conditions.append("ID > %s")
+            params.append(after)
+        order = "ID"
+
+    query = f"SELECT {columns} FROM {table}"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {order} LIMIT {int(page_size) + 1}"
+    return query, params, reverse
+
+
+def count_rows(table, where='', params=()):
+    """
+    Returns COUNT(*) for a table/filter, served from the query cache for up to COUNT_CACHE_TTL seconds
+    or until any process writes to the table.
+    """
+    def load():
+        query = f"SELECT COUNT(*) FROM {table}"
+        if where:
+            query += f" WHERE {where}"
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, tuple(params))
+            total = cursor.fetchone()[0]
+            cursor.close()
+        return total
+
+    return query_cache.get_or_load(table, ('count', where, tuple(params)), load, ttl=COUNT_CACHE_TTL)
+
+
+def fetch_page(view, where='', params=(), after=None, before=None, page_size=PAGE_SIZE):
+    """
+    Fetches one page of a view's table ordered by ID, starting after/before the given ID, through the query cache.
+    Only the view's columns are selected and rows come back as the view's row type.
+    """
+    page_size = clamp_page_size(page_size)
+    query, keyset_params, reverse = build_page_query(view.table, where, after, before, page_size, view.select_list)
+
+    def load():
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, tuple(params) + tuple(keyset_params))
+            rows = cursor.fetchall()
+            cursor.close()
+        return to_rows(view, rows)
+
+    cache_key = ('page', view.name, where, tuple(params), after, before, page_size)
+    rows = query_cache.get_or_load(view.table, cache_key, load)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]  # a copy, so reversing it leaves the cached list untouched
+    if reverse:
+        rows.reverse()
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after is not None, has_more
+
+    return Page(
+        rows=rows,
+        page_size=page_size,
+        first_id=rows[0].id if rows else None,
+        last_id=rows[-1].id if rows else None,
+        has_prev=has_prev and bool(rows),
+        has_next=has_next and bool(rows),
+        total_count=count_rows(view.table, where, params),
+    )
+
+
+def fetch_ranked_page(view, ranked_ids, page_number=1, page_size=PAGE_SIZE):
+    """
+    Fetches one page of an already ranked list of IDs (e.g. search results) by primary key,
+    keeping the ranking order.
+    """
+    page_size = clamp_page_size(page_size)
+    page_number = max(page_number or 1, 1)
+    page_ids = ranked_ids[(page_number - 1) * page_size:page_number * page_size]
+
+    def load():
+        if not page_ids:
+            return []
+        placeholders = ", ".join(["%s"] * len(page_ids))
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {view.select_list} FROM {view.table} WHERE ID IN ({placeholders})", tuple(page_ids))
+            rows = cursor.fetchall()
+            cursor.close()
+        return to_rows(view, rows)
+
+    by_id = {row.id: row for row in query_cache.get_or_load(view.table, ('ids', view.name, tuple(page_ids)), load)}
+    rows = [by_id[doc_id] for doc_id in page_ids if doc_id in by_id]
+    if len(rows) < len(page_ids):
+        # The index still holds rows deleted elsewhere; drop them and have it refresh
+        for doc_id in page_ids:
+            if doc_id not in by_id:
+                search_index.remove(view.table, doc_id)
+        search_index.mark_stale(view.table)
+
+    # Counted against the table, so IDs the index still holds for deleted rows are not included
+    total_count = count_rows(
+        view.table, "ID IN (SELECT VALUE FROM TABLE(FLATTEN(INPUT => PARSE_JSON(%s))))", [json.dumps(ranked_ids)]
+    ) if ranked_ids else 0
+
+    return Page(
+        rows=rows,
+        page_size=page_size,
+        first_id=rows[0].id if rows else None,
+        last_id=rows[-1].id if rows else None,
+        has_prev=page_number > 1,
+        has_next=page_number * page_size < len(ranked_ids),
+        total_count=total_count,
+        page_number=page_number,
+    )
@@ -0,0 +1,132 @@
+# preflight.py
+
+import json
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from snowflake.connector.errors import ProgrammingError
+
+from config import (
+    PREFLIGHT_WARN_BYTES, PREFLIGHT_BLOCK_BYTES, PREFLIGHT_WARN_ROWS, PREFLIGHT_BLOCK_ROWS, PREFLIGHT_COUNT_TIMEOUT,
+    FETCH_LARGE_CONFIG_BYTES, FETCH_LARGE_CONFIG_ROWS
+)
+from db_pool import pooled_connection, statement_timeout
+from log_utils import get_logger
+
+log = get_logger('preflight')
+
+# PREFLIGHT_STATUS values on STRL_QUEUE_CONFIG
+OK = 'OK'
+WARN = 'Warn'
+BLOCKED = 'Blocked'
+UNKNOWN = 'Unknown'  # no estimate could be taken, e.g. the warehouse was unreachable
+
+
+class Estimate(namedtuple('Estimate', ['status', 'bytes_scanned', 'partitions_scanned', 'partitions_total', 'rows', 'reasons'])):
+    """
+    Pre-flight estimate for one QUERY_STRING. Byte and partition counts come from the query plan;
+    `rows` is None when the COUNT probe was skipped or timed out.
+    """
+    __slots__ = ()
+
+    @property
+    def message(self):
+        return "; ".join(self.reasons)
+
+    def as_columns(self):
+        """The estimate as STRL_QUEUE_CONFIG column values."""
+        return {
+            'ESTIMATED_BYTES': self.bytes_scanned,
+            'ESTIMATED_PARTITIONS': self.partitions_scanned,
+            'ESTIMATED_ROWS': self.rows,
+            'PREFLIGHT_STATUS': self.status,
+            'PREFLIGHT_MESSAGE': self.message or None,
+            'PREFLIGHT_DATETIME': datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+        }
+
+
+def human_bytes(count):
+    for unit in ('B', 'KB', 'MB', 'GB', 'TB'):
+        if count < 1024 or unit == 'TB':
+            return f"{count:.0f} {unit}" if unit == 'B' else f"{count:.1f} {unit}"
+        count /= 1024
+
+
+def explain_query(cursor, query):
+    """
+    Compiles the query without running it. Returns (bytes scanned, partitions scanned, partitions total)
+    from the plan's GlobalStats; raises ProgrammingError if the query does not compile.
+    """
+    cursor.execute("EXPLAIN USING JSON " + query)
+    plan = json.loads(cursor.fetchone()[0])
+    stats = plan.get('GlobalStats', {})
+    return stats.get('bytesAssigned', 0), stats.get('partitionsAssigned', 0), stats.get('partitionsTotal', 0)
+
+
+def count_rows(cursor, query, timeout=PREFLIGHT_COUNT_TIMEOUT):
+    """Row count of the query's result, or None if counting takes longer than `timeout` seconds."""
+    try:
+        with statement_timeout(cursor, timeout):
+            cursor.execute(f"SELECT COUNT(*) FROM ({query})")
+            return cursor.fetchone()[0]
+    except ProgrammingError as e:
+        log.warning("Pre-flight row count did not finish: %s", e)
+        return None
+
+
+def classify(bytes_scanned, partitions_scanned, partitions_total, rows):
+    """Applies the warn / block thresholds to an estimate."""
+    blocked, warnings = [], []
+    if bytes_scanned >= PREFLIGHT_BLOCK_BYTES:
+        blocked.append(f"scans about {human_bytes(bytes_scanned)} (limit {human_bytes(PREFLIGHT_BLOCK_BYTES)})")
+    elif bytes_scanned >= PREFLIGHT_WARN_BYTES:
+        warnings.append(f"scans about {human_bytes(bytes_scanned)} ({partitions_scanned} of {partitions_total} partitions)")
+    if rows is not None and rows >= PREFLIGHT_BLOCK_ROWS:
+        blocked.append(f"returns {rows} rows (limit {PREFLIGHT_BLOCK_ROWS})")
+    elif rows is not None and rows >= PREFLIGHT_WARN_ROWS:
+        warnings.append(f"returns {rows} rows")
+    elif rows is None and not blocked:
+        warnings.append(f"row count not known within {PREFLIGHT_COUNT_TIMEOUT}s")
+
+    status = BLOCKED if blocked else WARN if warnings else OK
+    return Estimate(status, bytes_scanned, partitions_scanned, partitions_total, rows, blocked + warnings)
+
+
+def estimate_query(query_string):
+    """
+    Estimates what a QUERY_STRING will cost before it is saved: EXPLAIN gives the bytes and partitions
+    it would scan (and rejects queries that do not compile), then a COUNT(*) probe bounded by
+    PREFLIGHT_COUNT_TIMEOUT gives the rows it returns. The probe is skipped for queries already over
+    the byte limit. Returns an Estimate.
+    """
+    query = query_string.strip().rstrip(';').strip()
+    try:
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            try:
+                bytes_scanned, partitions_scanned, partitions_total = explain_query(cursor, query)
+            except ProgrammingError as e:
+                return Estimate(BLOCKED, None, None, None, None, [f"query does not compile: {e}"])
+            rows = count_rows(cursor, query) if bytes_scanned < PREFLIGHT_BLOCK_BYTES else None
+            cursor.close()
+    except Exception as e:
+        log.warning("Pre-flight estimate failed: %s", e)
+        return Estimate(UNKNOWN, None, None, None, None, [f"no estimate available: {e}"])
+    return classify(bytes_scanned, partitions_scanned, partitions_total, rows)
+
+
+def record_estimate(cursor, config_id, estimate):
+    """Stores an estimate on the config."""
+    columns = estimate.as_columns()
+    cursor.execute(
+        "UPDATE STRL_QUEUE_CONFIG SET " + ", ".join(f"{column} = %s" for column in columns) + " WHERE ID = %s",
+        list(columns.values()) + [config_id]
+    )
+
+
+def is_large(config):
+    """Whether a config's stored estimate puts it in the fetch run's separate lane for large configs."""
+    return (
+        (config.get('ESTIMATED_BYTES') or 0) >= FETCH_LARGE_CONFIG_BYTES
+        or (config.get('ESTIMATED_ROWS') or 0) >= FETCH_LARGE_CONFIG_ROWS
+    )
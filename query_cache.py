@@ -0,0 +1,174 @@
+# query_cache.py
+
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from config import QUERY_CACHE_TTL, QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_MAX_BYTES, QUERY_CACHE_VERSION_CHECK_INTERVAL
+from db_pool import pooled_connection, values_relation
+from log_utils import get_logger
+import search_index
+
+log = get_logger('query_cache')
+
+
+def estimate_size(value):
+    """Rough in-memory size of a cached result: rows of scalar values, or a scalar."""
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    return sys.getsizeof(value)
+
+
+class TableVersions:
+    """
+    Per-table write counters shared by all processes through STRL_TABLE_VERSION. Writers bump a table's
+    counter; readers re-read all counters at most every `interval` seconds, so a write from any process
+    is seen within that long. If the table cannot be read, the last counters seen are kept and cached
+    entries fall back to their TTL.
+    """
+
+    def __init__(self, interval=QUERY_CACHE_VERSION_CHECK_INTERVAL, on_change=None):
+        self._interval = interval
+        self._on_change = on_change
+        self._versions = {}
+        self._checked_at = None
+        self._refresh_lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT TABLE_NAME, VERSION FROM STRL_TABLE_VERSION")
+                versions = dict(cursor.fetchall())
+                cursor.close()
+        except Exception as e:
+            log.warning("Reading table versions failed: %s", e)
+            return
+        changed = [table for table, version in versions.items() if self._versions.get(table) != version]
+        self._versions = versions
+        if changed and self._on_change:
+            self._on_change(*changed)
+
+    def get(self, table):
+        """The table's current write counter, re-read first if the last read is older than the interval."""
+        now = time.monotonic()
+        if self._checked_at is None or now - self._checked_at >= self._interval:
+            # One thread re-reads; the others use the counters already seen
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._refresh()
+                    self._checked_at = time.monotonic()
+                finally:
+                    self._refresh_lock.release()
+        return self._versions.get(table, 0)
+
+    def bump(self, *tables):
+        """Records a write to each table for every process to see."""
+        if not tables:
+            return
+        try:
+            with pooled_connection() as conn:
+                cursor = conn.cursor()
+                values_sql, params = values_relation([(table,) for table in tables], ['TABLE_NAME'])
+                cursor.execute(f"""
+                    MERGE INTO STRL_TABLE_VERSION v
+                    USING {values_sql} t
+                    ON v.TABLE_NAME = t.TABLE_NAME
+                    WHEN MATCHED THEN UPDATE SET VERSION = v.VERSION + 1, UPDATED_DATETIME = CURRENT_TIMESTAMP()
+                    WHEN NOT MATCHED THEN INSERT (TABLE_NAME, VERSION, UPDATED_DATETIME) VALUES (t.TABLE_NAME, 1, CURRENT_TIMESTAMP())
+                """, params)
+                conn.commit()
+                cursor.close()
+        except Exception as e:
+            log.warning("Bumping table versions for %s failed: %s", ", ".join(tables), e)
+
+
+class QueryCache:
+    """
+    Read-through cache for list-page queries.
+    - Entries expire after a TTL and are grouped by table so a write can drop all of a table's entries.
+    - Least recently used entries are evicted once the entry count or the estimated byte size is over its limit.
+    - With `versions` (a TableVersions), an entry is only served while its table's write counter is the one
+      it was loaded under, so writes from other processes are seen within the version check interval.
+    """
+
+    def __init__(self, ttl=QUERY_CACHE_TTL, max_entries=QUERY_CACHE_MAX_ENTRIES, max_bytes=QUERY_CACHE_MAX_BYTES,
+                 versions=None):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._versions = versions
+        self._entries = OrderedDict()  # (table, key) -> (value, expires_at, size, version)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def _remove(self, entry_key):
+        _, _, size, _ = self._entries.pop(entry_key)
+        self._bytes -= size
+
+    def get_or_load(self, table, key, loader, ttl=None):
+        """Returns the cached value for (table, key), calling `loader()` and caching its result on a miss."""
+        entry_key = (table, key)
+        now = time.monotonic()
+        version = self._versions.get(table) if self._versions is not None else None
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None:
+                if entry[1] > now and entry[3] == version:
+                    self._entries.move_to_end(entry_key)
+                    self._stats['hits'] += 1
+                    return entry[0]
+                self._remove(entry_key)
+                self._stats['expirations'] += 1
+            self._stats['misses'] += 1
+
+        value = loader()
+        size = estimate_size(value)
+        if size > self._max_bytes:
+            return value
+
+        with self._lock:
+            if entry_key in self._entries:
+                self._remove(entry_key)
+            self._entries[entry_key] = (value, now + (ttl if ttl is not None else self._ttl), size, version)
+            self._bytes += size
+            while len(self._entries) > self._max_entries or self._bytes > self._max_bytes:
+                self._remove(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+        return value
+
+    def invalidate(self, *tables):
+        """Drops every cached entry for the given tables."""
+        with self._lock:
+            for entry_key in [entry_key for entry_key in self._entries if entry_key[0] in tables]:
+                self._remove(entry_key)
+                self._stats['invalidations'] += 1
+
+    def stats(self):
+        """Returns a snapshot of hit/miss counters and current usage."""
+        with self._lock:
+            snapshot = dict(self._stats)
+            snapshot['entries'] = len(self._entries)
+            snapshot['bytes'] = self._bytes
+        return snapshot
+
+
+# Write counters shared with every other process; a table written elsewhere also flags its search index
+table_versions = TableVersions(on_change=search_index.mark_stale)
+
+# Process-wide cache shared by the list pages and the writers that invalidate them
+query_cache = QueryCache(versions=table_versions)
+
+
+def invalidate_tables(*tables):
+    """
+    Drops cached list pages and totals for tables that were just written to, flags their search indexes
+    for refresh, and bumps their write counters so other processes drop theirs too.
+    """
+    query_cache.invalidate(*tables)
+    search_index.mark_stale(*tables)
+    table_versions.bump(*tables)
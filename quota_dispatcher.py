@@ -0,0 +1,193 @@
+# quota_dispatcher.py
+
+import math
+import time
+from datetime import datetime, timedelta, timezone
+
+from snowflake.connector import DictCursor
+
+from config import QUOTA_DISPATCH_INTERVAL, QUOTA_DISPATCH_CHUNK_SIZE, QUOTA_SMOOTHING
+from db_pool import pooled_connection, values_relation
+from query_cache import invalidate_tables
+from log_utils import get_logger
+
+log = get_logger('quota_dispatcher')
+
+# Active configs with payloads still waiting to be queued, and how many each has queued today
+PENDING_CONFIGS_QUERY = """
+    SELECT c.ID, c.SOURCE_ID, c.PRIORITY, c.MAXCOUNT_PER_DAY,
+           COUNT_IF(p.IS_QUEUED = 'N') AS PENDING,
+           COUNT_IF(p.IS_QUEUED = 'Y' AND p.QUEUED_DATETIME >= %(day_start)s) AS QUEUED_TODAY
+    FROM STRL_QUEUE_CONFIG c
+    JOIN STRL_PAYLOAD_MASTER p ON p.CONFIG_ID = c.ID AND p.IS_ACTIVE_STATUS = 'Y'
+    WHERE c.IS_ACTIVE_STATUS = 'Y'
+    GROUP BY c.ID, c.SOURCE_ID, c.PRIORITY, c.MAXCOUNT_PER_DAY
+    HAVING COUNT_IF(p.IS_QUEUED = 'N') > 0
+"""
+
+# Per-source limits and today's usage across all of the source's configs
+SOURCE_USAGE_QUERY = """
+    SELECT s.ID, s.MAXCOUNT_PER_DAY, COUNT(p.ID) AS QUEUED_TODAY
+    FROM STRL_SOURCE_MASTER s
+    LEFT JOIN STRL_PAYLOAD_MASTER p
+      ON p.SOURCE_ID = s.ID AND p.IS_QUEUED = 'Y' AND p.QUEUED_DATETIME >= %(day_start)s
+    GROUP BY s.ID, s.MAXCOUNT_PER_DAY
+"""
+
+
+class DailyBucket:
+    """
+    Token bucket holding one day's MAXCOUNT_PER_DAY, reset at UTC midnight.
+    With smoothing, tokens accrue evenly through the day instead of all being available at midnight,
+    so downstream scrapers see a steady rate. A missing or non-positive limit means unlimited.
+    """
+
+    def __init__(self, limit, used_today, day_fraction=1.0):
+        self.limit = limit if limit and limit > 0 else None
+        if self.limit is None:
+            self.available = None
+        else:
+            self.available = max(0, math.ceil(self.limit * day_fraction) - used_today)
+
+    def take(self, wanted):
+        """Grants up to `wanted` tokens and returns how many were granted."""
+        if self.available is None:
+            return wanted
+        granted = min(wanted, self.available)
+        self.available -= granted
+        return granted
+
+
+def allocate(configs, source_buckets, day_fraction):
+    """
+    Grants each config as many payloads as its own bucket and its source's bucket allow,
+    highest priority first (PRIORITY 1 first, unassigned 0 last). Returns {config_id: granted}.
+    """
+    grants = {}
+    for config in sorted(configs, key=lambda c: (c['PRIORITY'] or math.inf, c['ID'])):
+        config_bucket = DailyBucket(config['MAXCOUNT_PER_DAY'], config['QUEUED_TODAY'], day_fraction)
+        source_bucket = source_buckets.get(config['SOURCE_ID']) or DailyBucket(None, 0)
+        wanted = config_bucket.take(config['PENDING'])
+        # Only what the source can also absorb is granted; tokens not used stay in the source bucket
+        granted = source_bucket.take(wanted)
+        if granted:
+            grants[config['ID']] = granted
+    return grants
+
+
+def projected_completion(config, granted, source_limit, today):
+    """The UTC date on which the config's pending payloads will all have been queued at its daily rate."""
+    remaining = config['PENDING'] - granted
+    if remaining <= 0:
+        return today
+    limits = [limit for limit in (config['MAXCOUNT_PER_DAY'], source_limit) if limit and limit > 0]
+    if not limits:
+        return today
+    return today + timedelta(days=math.ceil(remaining / min(limits)))
+
+
+def release_payloads(cursor, grants, now):
+    """
+    Flips IS_QUEUED to 'Y' on the oldest pending payloads of each config, up to its grant, with one
+    UPDATE per QUOTA_DISPATCH_CHUNK_SIZE configs. Returns the number of payloads released.
+    """
+    released = 0
+    items = list(grants.items())
+    for start in range(0, len(items), QUOTA_DISPATCH_CHUNK_SIZE):
+        chunk = items[start:start + QUOTA_DISPATCH_CHUNK_SIZE]
+        values_sql, params = values_relation(chunk, ['CONFIG_ID', 'GRANTED'])
+        config_ids = [config_id for config_id, _ in chunk]
+        # The ROW_NUMBER only ranks the chunk's own pending payloads, not the whole table
+        cursor.execute(f"""
+            UPDATE STRL_PAYLOAD_MASTER p
+            SET IS_QUEUED = 'Y', QUEUED_DATETIME = %s, LAST_UPDATED_DATETIME = %s
+            FROM (
+                SELECT r.ID
+                FROM (
+                    SELECT ID, CONFIG_ID, ROW_NUMBER() OVER (PARTITION BY CONFIG_ID ORDER BY ID) AS RN
+                    FROM STRL_PAYLOAD_MASTER
+                    WHERE IS_QUEUED = 'N' AND IS_ACTIVE_STATUS = 'Y'
+                      AND CONFIG_ID IN ({", ".join(["%s"] * len(config_ids))})
+                ) r
+                JOIN {values_sql} t ON r.CONFIG_ID = t.CONFIG_ID
+                WHERE r.RN <= t.GRANTED
+            ) q
+            WHERE p.ID = q.ID AND p.IS_QUEUED = 'N'
+        """, [now, now] + config_ids + params)
+        released += cursor.rowcount
+    return released
+
+
+def record_projections(cursor, projections):
+    """Stores each config's projected completion date on STRL_QUEUE_CONFIG."""
+    items = list(projections.items())
+    for start in range(0, len(items), QUOTA_DISPATCH_CHUNK_SIZE):
+        chunk = items[start:start + QUOTA_DISPATCH_CHUNK_SIZE]
+        values_sql, params = values_relation(chunk, ['CONFIG_ID', 'PROJECTED_COMPLETION_DATE'])
+        cursor.execute(f"""
+            UPDATE STRL_QUEUE_CONFIG c
+            SET PROJECTED_COMPLETION_DATE = t.PROJECTED_COMPLETION_DATE
+            FROM {values_sql} t
+            WHERE c.ID = t.CONFIG_ID
+        """, params)
+
+
+def dispatch_payloads(now=None):
+    """
+    Releases pending payloads to the queue within today's per-config and per-source quotas.
+    Returns a list of {config_id, pending, released, projected_completion} dicts.
+    """
+    now = now or datetime.now(timezone.utc)
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    day_fraction = (now - day_start).total_seconds() / 86400 if QUOTA_SMOOTHING else 1.0
+
+    with pooled_connection() as conn:
+        with conn.cursor(DictCursor) as cursor:
+            cursor.execute(PENDING_CONFIGS_QUERY, {'day_start': day_start})
+            configs = cursor.fetchall()
+            if not configs:
+                log.info("No payloads waiting to be queued")
+                return []
+
+            cursor.execute(SOURCE_USAGE_QUERY, {'day_start': day_start})
+            sources = {row['ID']: row for row in cursor.fetchall()}
+            source_buckets = {
+                source_id: DailyBucket(row['MAXCOUNT_PER_DAY'], row['QUEUED_TODAY'], day_fraction)
+                for source_id, row in sources.items()
+            }
+
+            grants = allocate(configs, source_buckets, day_fraction)
+            released = release_payloads(cursor, grants, now) if grants else 0
+
+            report, projections = [], {}
+            for config in configs:
+                source = sources.get(config['SOURCE_ID'])
+                granted = grants.get(config['ID'], 0)
+                completion = projected_completion(config, granted, source['MAXCOUNT_PER_DAY'] if source else None, now.date())
+                projections[config['ID']] = completion
+                report.append({
+                    'config_id': config['ID'],
+                    'pending': config['PENDING'],
+                    'released': granted,
+                    'projected_completion': completion,
+                })
+            record_projections(cursor, projections)
+        conn.commit()
+
+    invalidate_tables("STRL_PAYLOAD_MASTER", "STRL_QUEUE_CONFIG")
+    log.info("Released %d payloads across %d configs", released, len(grants))
+    return report
+
+
+def run_forever(interval=QUOTA_DISPATCH_INTERVAL):
+    log.info("Quota dispatcher started")
+    while True:
+        try:
+            dispatch_payloads()
+        except Exception as e:
+            log.exception("Quota dispatch failed: %s", e)
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    run_forever()
@@ -0,0 +1,145 @@
+# rebalance.py
+
+import fcntl
+import os
+import threading
+import time
+
+from config import REBALANCE_DEBOUNCE_SECONDS, REBALANCE_MAX_DELAY_SECONDS, REBALANCE_LOCK_PATH
+from script_01 import update_priorities
+from log_utils import get_logger
+
+log = get_logger('rebalance')
+
+
+class RebalanceCoordinator:
+    """
+    Debounces and coalesces priority rebalance requests into a single background update_priorities run.
+    - Each request (re)starts a short timer, so a burst of edits triggers one run; a run is never
+      postponed more than REBALANCE_MAX_DELAY_SECONDS after the first request of the burst.
+    - The run holds an exclusive flock on REBALANCE_LOCK_PATH, so only one rebalance runs at a time
+      across all worker processes on the host. If another process holds it, the run is retried later.
+    - A marker file next to the lock records that a rebalance is pending, for every process to see.
+      It is removed only after a successful run that no request arrived during; a run that fails
+      (raises or returns False) is retried after REBALANCE_MAX_DELAY_SECONDS.
+    - A marker that nobody will act on, because the process that requested it died before its timer
+      fired or during the run, is picked up by any coordinator that sees it: on start-up and whenever
+      is_pending() is asked.
+    """
+
+    def __init__(self, delay=REBALANCE_DEBOUNCE_SECONDS, max_delay=REBALANCE_MAX_DELAY_SECONDS,
+                 lock_path=REBALANCE_LOCK_PATH, run=update_priorities):
+        self._delay = delay
+        self._max_delay = max_delay
+        self._lock_path = lock_path
+        self._pending_path = lock_path + '.pending'
+        self._run = run
+        self._timer = None
+        self._first_requested_at = None
+        self._state_lock = threading.Lock()
+        self.recover()
+
+    def _schedule(self, delay):
+        """Arms the timer. Caller must hold the state lock."""
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._fire)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _marker_mtime(self):
+        try:
+            return os.stat(self._pending_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def request(self):
+        """Asks for a rebalance soon. Returns immediately."""
+        with open(self._pending_path, 'a'):
+            pass
+        # Touched on every request, so a run can tell whether a request arrived while it was running
+        os.utime(self._pending_path)
+        with self._state_lock:
+            now = time.monotonic()
+            if self._first_requested_at is None:
+                self._first_requested_at = now
+            remaining = self._first_requested_at + self._max_delay - now
+            self._schedule(max(0, min(self._delay, remaining)))
+
+    def recover(self):
+        """
+        Schedules a run for a marker left behind by a process that died: no timer here, no process
+        holding the lock, and no request for longer than any live timer would wait.
+        """
+        requested_at = self._marker_mtime()
+        if requested_at is None or time.time() - requested_at / 1e9 < 2 * self._max_delay:
+            return
+        with self._state_lock:
+            if self._timer is not None:
+                return
+        if self.is_running():
+            return
+        log.warning("Found a rebalance request nobody is handling; scheduling it")
+        with self._state_lock:
+            if self._timer is None:
+                self._schedule(self._delay)
+
+    def _fire(self):
+        with open(self._lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another process is rebalancing; run again once it is likely done so our change is included
+                with self._state_lock:
+                    self._schedule(self._delay)
+                return
+
+            try:
+                with self._state_lock:
+                    self._timer = None
+                    self._first_requested_at = None
+                requested_at = self._marker_mtime()
+                if requested_at is None:
+                    # A run in another process already covered every request
+                    return
+                succeeded = self._run() is not False
+                if succeeded and self._marker_mtime() == requested_at:
+                    os.remove(self._pending_path)
+            except Exception as e:
+                log.exception("Background priority rebalance failed: %s", e)
+                succeeded = False
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+        if not succeeded:
+            log.warning("Priority rebalance will be retried in %ss", self._max_delay)
+            with self._state_lock:
+                if self._timer is None:
+                    self._schedule(self._max_delay)
+
+    def is_running(self):
+        """True while any process holds the rebalance lock."""
+        with open(self._lock_path, 'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+            return False
+
+    def is_pending(self):
+        """True if a rebalance has been requested and not yet finished, in this or any other process."""
+        self.recover()
+        return os.path.exists(self._pending_path) or self.is_running()
+
+
+coordinator = RebalanceCoordinator()
+
+
+def request_rebalance():
+    """Schedules a coalesced background update_priorities run and returns immediately."""
+    coordinator.request()
+
+
+def is_rebalance_pending():
+    return coordinator.is_pending()
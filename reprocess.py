@@ -0,0 +1,210 @@
+# reprocess.py
+
+import time
+from datetime import datetime, timezone
+
+from snowflake.connector import DictCursor
+
+from config import (
+    REPROCESS_MAX_RETRIES, REPROCESS_BACKOFF_SECONDS, REPROCESS_CONCURRENCY, REPROCESS_INTERVAL, EMAIL_DIGEST_MODE
+)
+from db_pool import pooled_connection
+from email_utils import notify_developers, EmailDigest
+from query_cache import invalidate_tables
+from script_02 import CONFIG_COLUMNS, PAYLOAD_COLUMNS, attach_fetch_limits, process_configs_concurrently
+from run_ledger import FetchRun, FetchRunActive
+import run_ledger
+import status
+from log_utils import get_logger
+
+log = get_logger('reprocess')
+
+# Reprocess entries whose backoff (REPROCESS_BACKOFF_SECONDS * 2^FAIL_COUNT) has elapsed and that are under the retry cap
+ELIGIBLE_ENTRIES = """
+    SELECT ID, CONFIG_ID, SOURCE_ID, SCRIPT_ID, INPUT_DATA,
+           SHA2(COALESCE(TO_JSON(TRY_PARSE_JSON(INPUT_DATA)), INPUT_DATA), 256) AS PAYLOAD_HASH
+    FROM STRL_QUEUE_REPROCESS
+    WHERE COALESCE(IS_RETRIED, 'N') = 'N'
+      AND COALESCE(FAIL_COUNT, 0) < %(max_retries)s
+      AND DATEADD(second, %(backoff)s * POWER(2, COALESCE(FAIL_COUNT, 0)), COALESCE(LAST_FAILED_DATE, '1970-01-01'::TIMESTAMP_NTZ)) <= %(now)s
+"""
+
+
+def backoff_params(now):
+    return {'max_retries': REPROCESS_MAX_RETRIES, 'backoff': REPROCESS_BACKOFF_SECONDS, 'now': now}
+
+
+def requeue_failed_payloads(cursor, now):
+    """
+    Sends the payloads named by eligible STRL_QUEUE_REPROCESS entries back through dispatch and
+    aggregation, rather than re-running their whole config: the matching payload row is reset to
+    un-queued, or inserted if it is not in STRL_PAYLOAD_MASTER. Returns the number of entries retried.
+    """
+    params = backoff_params(now)
+
+    # Reset payloads that are already loaded (matched on CONFIG_ID + PAYLOAD_HASH)
+    cursor.execute(f"""
+        UPDATE STRL_PAYLOAD_MASTER p
+        SET IS_QUEUED = 'N', IS_AGGREGATED = 'N', QUEUED_DATETIME = NULL, QUEUE_MASTER_ID = NULL, QUEUE_NAME = NULL,
+            LAST_UPDATED_DATETIME = %(now)s
+        FROM ({ELIGIBLE_ENTRIES}) r
+        WHERE p.CONFIG_ID = r.CONFIG_ID AND p.PAYLOAD_HASH = r.PAYLOAD_HASH
+    """, params)
+
+    # Insert the rest as new payloads
+    cursor.execute(f"""
+        INSERT INTO STRL_PAYLOAD_MASTER ({PAYLOAD_COLUMNS}, PAYLOAD_HASH)
+        SELECT r.SOURCE_ID, r.SCRIPT_ID, r.CONFIG_ID, c.PRIORITY, r.INPUT_DATA, 'system', %(now)s,
+               'N', 'N', 'N', %(now)s, 'Y', r.PAYLOAD_HASH
+        FROM ({ELIGIBLE_ENTRIES}) r
+        JOIN STRL_QUEUE_CONFIG c ON c.ID = r.CONFIG_ID
+        WHERE NOT EXISTS (
+            SELECT 1 FROM STRL_PAYLOAD_MASTER p
+            WHERE p.CONFIG_ID = r.CONFIG_ID AND p.PAYLOAD_HASH = r.PAYLOAD_HASH
+        )
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY r.CONFIG_ID, r.PAYLOAD_HASH ORDER BY r.ID) = 1
+    """, params)
+
+    cursor.execute(f"""
+        UPDATE STRL_QUEUE_REPROCESS
+        SET IS_RETRIED = 'Y', RETRIED_DATE = %(now)s
+        WHERE ID IN (SELECT ID FROM ({ELIGIBLE_ENTRIES}))
+    """, params)
+    return cursor.rowcount
+
+
+def retry_failed_batches(cursor, now):
+    """
+    Puts errored STRL_QUEUE_MASTER batches back to Pending once their backoff has elapsed,
+    incrementing RETRY_COUNT; batches at the retry cap are dropped. ERROR_DETAILS is kept.
+    Returns (batches retried, batches dropped).
+    """
+    params = dict(backoff_params(now), error=status.BATCH_ERROR, pending=status.BATCH_PENDING, dropped=status.BATCH_DROPPED)
+    cursor.execute("""
+        UPDATE STRL_QUEUE_MASTER
+        SET PROCESS_STATUS = %(dropped)s, IS_DROPPED = 'Y', DROPPED_DATE = %(now)s, LAST_UPDATED_DATETIME = %(now)s
+        WHERE PROCESS_STATUS = %(error)s
+          AND COALESCE(IS_DROPPED, 'N') = 'N'
+          AND COALESCE(RETRY_COUNT, 0) >= %(max_retries)s
+    """, params)
+    dropped = cursor.rowcount
+
+    cursor.execute("""
+        UPDATE STRL_QUEUE_MASTER
+        SET PROCESS_STATUS = %(pending)s, RETRY_COUNT = COALESCE(RETRY_COUNT, 0) + 1, LAST_UPDATED_DATETIME = %(now)s
+        WHERE PROCESS_STATUS = %(error)s
+          AND COALESCE(IS_DROPPED, 'N') = 'N'
+          AND COALESCE(RETRY_COUNT, 0) < %(max_retries)s
+          AND DATEADD(second, %(backoff)s * POWER(2, COALESCE(RETRY_COUNT, 0)), LAST_UPDATED_DATETIME) <= %(now)s
+    """, params)
+    return cursor.rowcount, dropped
+
+
+def errored_configs_due(cursor, now):
+    """Active configs in Error whose backoff (by FETCH_RETRY_COUNT) has elapsed and that are under the retry cap."""
+    cursor.execute(f"""
+        SELECT {CONFIG_COLUMNS}
+        FROM STRL_QUEUE_CONFIG
+        WHERE LIVE_PROCESS_STATUS = %(error)s
+          AND IS_ACTIVE_STATUS = 'Y'
+          AND COALESCE(FETCH_RETRY_COUNT, 0) < %(max_retries)s
+          AND DATEADD(second, %(backoff)s * POWER(2, COALESCE(FETCH_RETRY_COUNT, 0)), LIVE_PROCESS_STATUS_UPDATED_DATETIME) <= %(now)s
+        ORDER BY PRIORITY
+    """, dict(backoff_params(now), error=status.ERROR))
+    return attach_fetch_limits(cursor, cursor.fetchall())
+
+
+def record_config_retries(results):
+    """
+    Bumps FETCH_RETRY_COUNT for configs that failed again and returns those now at the retry cap.
+    (A successful fetch resets the count itself.)
+    """
+    failed = [result['config_id'] for result in results if result['status'] == status.ERROR]
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        exhausted = []
+        if failed:
+            placeholders = ", ".join(["%s"] * len(failed))
+            cursor.execute(
+                f"UPDATE STRL_QUEUE_CONFIG SET FETCH_RETRY_COUNT = COALESCE(FETCH_RETRY_COUNT, 0) + 1 WHERE ID IN ({placeholders})",
+                failed
+            )
+            cursor.execute(
+                f"SELECT ID FROM STRL_QUEUE_CONFIG WHERE ID IN ({placeholders}) AND FETCH_RETRY_COUNT >= %s",
+                failed + [REPROCESS_MAX_RETRIES]
+            )
+            exhausted = [row[0] for row in cursor.fetchall()]
+        conn.commit()
+        cursor.close()
+    return exhausted
+
+
+def reprocess(now=None, concurrency=REPROCESS_CONCURRENCY):
+    """
+    One reprocess pass:
+    - failed payloads from STRL_QUEUE_REPROCESS are requeued individually,
+    - errored STRL_QUEUE_MASTER batches go back to Pending (or are dropped at the cap),
+    - errored configs are re-fetched, at most `concurrency` at a time.
+    Everything backs off exponentially from REPROCESS_BACKOFF_SECONDS and stops after REPROCESS_MAX_RETRIES.
+    Returns a summary dict.
+    """
+    now = now or datetime.now(timezone.utc)
+
+    with pooled_connection() as conn:
+        with conn.cursor(DictCursor) as cursor:
+            entries = requeue_failed_payloads(cursor, now)
+            batches, dropped = retry_failed_batches(cursor, now)
+            configs = errored_configs_due(cursor, now)
+        conn.commit()
+    invalidate_tables("STRL_PAYLOAD_MASTER", "STRL_QUEUE_MASTER", "STRL_QUEUE_REPROCESS")
+    log.info("Requeued %d failed payloads, retried %d batches, dropped %d batches", entries, batches, dropped)
+
+    results, exhausted, run = [], [], None
+    if configs:
+        try:
+            run = FetchRun.start([config['ID'] for config in configs])
+        except FetchRunActive as e:
+            # Their backoff has elapsed, so the next pass picks them up
+            log.warning("Errored configs left for the next pass: %s", e, extra={'active_run_id': e.run_id})
+    if run is not None:
+        digest = EmailDigest("STRL reprocess run") if EMAIL_DIGEST_MODE else None
+        try:
+            # No separate large-config lane, so `concurrency` bounds the warehouse load of the whole pass
+            results = process_configs_concurrently(configs, concurrency, run, digest=digest, large_concurrency=0)
+            run.finish(run_ledger.COMPLETED)
+            exhausted = record_config_retries(results)
+        except Exception:
+            run.finish(run_ledger.FAILED)
+            raise
+        finally:
+            invalidate_tables("STRL_PAYLOAD_MASTER", "STRL_QUEUE_CONFIG")
+            if digest is not None:
+                digest.send()
+        log.info("Re-fetched %d errored configs", len(results), extra={'run_id': run.run_id})
+        if exhausted:
+            notify_developers(
+                "Configs out of retries",
+                f"Configs {exhausted} failed {REPROCESS_MAX_RETRIES} times and will not be retried automatically."
+            )
+
+    return {
+        'payloads_requeued': entries,
+        'batches_retried': batches,
+        'batches_dropped': dropped,
+        'configs_retried': len(results),
+        'configs_exhausted': exhausted,
+    }
+
+
+def run_forever(interval=REPROCESS_INTERVAL):
+    log.info("Reprocess engine started")
+    while True:
+        try:
+            reprocess()
+        except Exception as e:
+            log.exception("Reprocess pass failed: %s", e)
+        time.sleep(interval)
+
+
+if __name__ == '__main__':
+    run_forever()
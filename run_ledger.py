@@ -0,0 +1,262 @@
+# run_ledger.py
+
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from snowflake.connector import DictCursor
+
+from config import FETCH_RUN_HEARTBEAT_INTERVAL, FETCH_RUN_STALE_AFTER
+from db_pool import pooled_connection
+from log_utils import get_logger
+
+log = get_logger('run_ledger')
+
+# Per-config phases recorded in STRL_FETCH_RUN_CONFIG
+PENDING = 'pending'
+STAGED = 'staged'  # query results are in STRL_PAYLOAD_STAGE; ROW_OFFSET is the next SEQ to publish
+DONE = 'done'
+ERROR = 'error'
+RESUMED = 'resumed'  # the checkpoint was taken over by a later run
+SUPERSEDED = 'superseded'  # a later run fetched the config again; the staged rows were dropped
+
+# STATUS values in STRL_FETCH_RUN
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+INTERRUPTED = 'interrupted'
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+class FetchRunActive(Exception):
+    """Raised when a fetch run is started while another run, in any process, is still heartbeating."""
+
+    def __init__(self, run_id):
+        super().__init__(f"Fetch run {run_id} is still running")
+        self.run_id = run_id
+
+
+def active_run_id(cursor):
+    """RUN_ID of a running fetch run whose heartbeat is still fresh, or None."""
+    cursor.execute(
+        "SELECT RUN_ID FROM STRL_FETCH_RUN WHERE STATUS = %s AND HEARTBEAT_DATETIME >= %s ORDER BY STARTED_DATETIME LIMIT 1",
+        (RUNNING, utc_now() - timedelta(seconds=FETCH_RUN_STALE_AFTER))
+    )
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+class FetchRun:
+    """
+    Ledger for one fetch run: a STRL_FETCH_RUN row plus one STRL_FETCH_RUN_CONFIG checkpoint per config.
+    While the run is active a background thread refreshes its heartbeat; a run whose heartbeat is older
+    than FETCH_RUN_STALE_AFTER is treated as interrupted, and later runs take over its staged configs.
+    """
+
+    def __init__(self, run_id):
+        self.run_id = run_id
+        self._stopped = threading.Event()
+        self._heartbeat_thread = None
+
+    @classmethod
+    def start(cls, config_ids, run_id=None):
+        """
+        Records a new run over `config_ids` under `run_id` (a new ID if not given), marks runs that stopped heartbeating as interrupted, and starts
+        the heartbeat. Raises FetchRunActive if another run is still heartbeating: the run row is inserted
+        by a MERGE that only matches when no running row exists, and MERGE locks the table, so two
+        processes starting at once cannot both get in.
+        """
+        run = cls(run_id or uuid.uuid4().hex)
+        now = utc_now()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE STRL_FETCH_RUN SET STATUS = %s WHERE STATUS = %s AND HEARTBEAT_DATETIME < %s",
+                (INTERRUPTED, RUNNING, now - timedelta(seconds=FETCH_RUN_STALE_AFTER))
+            )
+            if cursor.rowcount:
+                log.warning("Marked %d stale fetch runs as interrupted", cursor.rowcount)
+            cursor.execute("""
+                MERGE INTO STRL_FETCH_RUN r
+                USING (SELECT %s AS RUN_ID) n
+                ON r.STATUS = %s
+                WHEN NOT MATCHED THEN INSERT (RUN_ID, STATUS, CONFIGS_TOTAL, STARTED_DATETIME, HEARTBEAT_DATETIME)
+                VALUES (n.RUN_ID, %s, %s, %s, %s)
+            """, (run.run_id, RUNNING, RUNNING, len(config_ids), now, now))
+            if not cursor.rowcount:
+                active = active_run_id(cursor)
+                conn.commit()
+                cursor.close()
+                raise FetchRunActive(active)
+            if config_ids:
+                cursor.executemany("""
+                    INSERT INTO STRL_FETCH_RUN_CONFIG (RUN_ID, CONFIG_ID, PHASE, ROWS_FETCHED, ROW_OFFSET, ROWS_INSERTED, UPDATED_DATETIME)
+                    VALUES (%s, %s, %s, 0, 0, 0, %s)
+                """, [(run.run_id, config_id, PENDING, now) for config_id in config_ids])
+            conn.commit()
+            cursor.close()
+
+        run._heartbeat_thread = threading.Thread(target=run._beat, name=f'fetch-run-{run.run_id[:8]}', daemon=True)
+        run._heartbeat_thread.start()
+        return run
+
+    def _beat(self):
+        while not self._stopped.wait(FETCH_RUN_HEARTBEAT_INTERVAL):
+            try:
+                with pooled_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute(
+                        "UPDATE STRL_FETCH_RUN SET HEARTBEAT_DATETIME = %s WHERE RUN_ID = %s",
+                        (utc_now(), self.run_id)
+                    )
+                    conn.commit()
+                    cursor.close()
+            except Exception as e:
+                log.warning("Heartbeat for fetch run %s failed: %s", self.run_id, e, extra={'run_id': self.run_id})
+
+    def checkpoint(self, cursor, config_id, phase, **counts):
+        """
+        Records a config's phase and any of rows_fetched / row_offset / rows_inserted on the caller's
+        cursor, so it commits together with the work it describes.
+        """
+        assignments = {'PHASE': phase, 'UPDATED_DATETIME': utc_now()}
+        assignments.update({name.upper(): value for name, value in counts.items()})
+        cursor.execute(
+            "UPDATE STRL_FETCH_RUN_CONFIG SET " + ", ".join(f"{column} = %s" for column in assignments)
+            + " WHERE RUN_ID = %s AND CONFIG_ID = %s",
+            list(assignments.values()) + [self.run_id, config_id]
+        )
+
+    def adopt(self, cursor, config_id, stage_table, query_key):
+        """
+        Takes over the latest staged checkpoint an interrupted or failed run left for this config: its staged rows
+        are moved to this run and its counters returned as (rows_fetched, row_offset, rows_inserted).
+        Only a checkpoint taken for the config's current query (`query_key`) and after its last status change
+        qualifies, so rows staged before a later fetch, an error or a query edit are never published.
+        Returns None when there is nothing to resume.
+        """
+        cursor.execute("""
+            SELECT c.RUN_ID, c.ROWS_FETCHED, c.ROW_OFFSET, c.ROWS_INSERTED
+            FROM STRL_FETCH_RUN_CONFIG c
+            JOIN STRL_FETCH_RUN r ON r.RUN_ID = c.RUN_ID
+            JOIN STRL_QUEUE_CONFIG q ON q.ID = c.CONFIG_ID
+            WHERE c.CONFIG_ID = %s AND c.PHASE = %s AND r.STATUS IN (%s, %s)
+              AND c.QUERY_KEY = %s
+              AND c.UPDATED_DATETIME > COALESCE(q.LIVE_PROCESS_STATUS_UPDATED_DATETIME, '1970-01-01'::TIMESTAMP_NTZ)
+            ORDER BY c.UPDATED_DATETIME DESC
+            LIMIT 1
+        """, (config_id, STAGED, INTERRUPTED, FAILED, query_key))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        if isinstance(row, dict):
+            row = (row['RUN_ID'], row['ROWS_FETCHED'], row['ROW_OFFSET'], row['ROWS_INSERTED'])
+        old_run_id, rows_fetched, row_offset, rows_inserted = row
+
+        # Guarded so two runs cannot both take over the same checkpoint
+        cursor.execute(
+            "UPDATE STRL_FETCH_RUN_CONFIG SET PHASE = %s, UPDATED_DATETIME = %s WHERE RUN_ID = %s AND CONFIG_ID = %s AND PHASE = %s",
+            (RESUMED, utc_now(), old_run_id, config_id, STAGED)
+        )
+        if not cursor.rowcount:
+            return None
+        cursor.execute(
+            f"UPDATE {stage_table} SET RUN_ID = %s WHERE RUN_ID = %s AND CONFIG_ID = %s",
+            (self.run_id, old_run_id, config_id)
+        )
+        self.checkpoint(
+            cursor, config_id, STAGED,
+            rows_fetched=rows_fetched, row_offset=row_offset, rows_inserted=rows_inserted, query_key=query_key
+        )
+        log.info(
+            "Config %s: resuming run %s at offset %s (%s of %s rows already published)",
+            config_id, old_run_id, row_offset, rows_inserted, rows_fetched,
+            extra={'run_id': self.run_id, 'config_id': config_id, 'resumed_run_id': old_run_id}
+        )
+        return rows_fetched, row_offset, rows_inserted
+
+    def supersede(self, cursor, config_id, stage_table):
+        """
+        Marks staged checkpoints that stopped runs left for this config as superseded and deletes their staged
+        rows, once this run has staged or published the config itself. Runs still marked running are left alone.
+        """
+        stopped = """
+            SELECT c.RUN_ID
+            FROM STRL_FETCH_RUN_CONFIG c
+            JOIN STRL_FETCH_RUN r ON r.RUN_ID = c.RUN_ID
+            WHERE c.CONFIG_ID = %(config_id)s AND c.PHASE = %(staged)s AND c.RUN_ID != %(run_id)s AND r.STATUS != %(running)s
+        """
+        params = {'config_id': config_id, 'staged': STAGED, 'run_id': self.run_id, 'running': RUNNING}
+        cursor.execute(f"DELETE FROM {stage_table} WHERE CONFIG_ID = %(config_id)s AND RUN_ID IN ({stopped})", params)
+        cursor.execute(f"""
+            UPDATE STRL_FETCH_RUN_CONFIG
+            SET PHASE = %(superseded)s, UPDATED_DATETIME = %(now)s
+            WHERE CONFIG_ID = %(config_id)s AND PHASE = %(staged)s AND RUN_ID IN ({stopped})
+        """, dict(params, superseded=SUPERSEDED, now=utc_now()))
+        if cursor.rowcount:
+            log.info("Config %s: dropped %d superseded staged checkpoints", config_id, cursor.rowcount,
+                     extra={'run_id': self.run_id, 'config_id': config_id})
+
+    def finish(self, run_status):
+        """Stops the heartbeat and records how the run ended."""
+        self._stopped.set()
+        now = utc_now()
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE STRL_FETCH_RUN SET STATUS = %s, HEARTBEAT_DATETIME = %s, FINISHED_DATETIME = %s WHERE RUN_ID = %s",
+                (run_status, now, now, self.run_id)
+            )
+            conn.commit()
+            cursor.close()
+
+
+def run_progress(run_id):
+    """
+    Progress of a fetch run from the ledger, readable from any process: its status, the configs it
+    covers and has finished, the rows published and skipped, and the errors recorded for its failed
+    configs. A run still marked running whose heartbeat went stale is reported as interrupted.
+    Returns None for an unknown run.
+    """
+    with pooled_connection() as conn:
+        with conn.cursor(DictCursor) as cursor:
+            cursor.execute("""
+                SELECT r.STATUS, r.CONFIGS_TOTAL, r.STARTED_DATETIME, r.HEARTBEAT_DATETIME, r.FINISHED_DATETIME,
+                       COUNT_IF(c.PHASE IN (%(done)s, %(error)s)) AS CONFIGS_DONE,
+                       COALESCE(SUM(IFF(c.PHASE = %(done)s, c.ROWS_INSERTED, 0)), 0) AS ROWS_INSERTED,
+                       COALESCE(SUM(IFF(c.PHASE = %(done)s, c.ROWS_FETCHED - c.ROWS_INSERTED, 0)), 0) AS DUPLICATES_SKIPPED
+                FROM STRL_FETCH_RUN r
+                LEFT JOIN STRL_FETCH_RUN_CONFIG c ON c.RUN_ID = r.RUN_ID
+                WHERE r.RUN_ID = %(run_id)s
+                GROUP BY r.STATUS, r.CONFIGS_TOTAL, r.STARTED_DATETIME, r.HEARTBEAT_DATETIME, r.FINISHED_DATETIME
+            """, {'run_id': run_id, 'done': DONE, 'error': ERROR})
+            run = cursor.fetchone()
+            if run is None:
+                return None
+            cursor.execute("""
+                SELECT c.CONFIG_ID, q.ERROR_STRING
+                FROM STRL_FETCH_RUN_CONFIG c
+                LEFT JOIN STRL_QUEUE_CONFIG q ON q.ID = c.CONFIG_ID
+                WHERE c.RUN_ID = %s AND c.PHASE = %s
+                ORDER BY c.CONFIG_ID
+            """, (run_id, ERROR))
+            errors = [{'config_id': row['CONFIG_ID'], 'error': row['ERROR_STRING']} for row in cursor.fetchall()]
+
+    run_status = run['STATUS']
+    stale_before = utc_now().replace(tzinfo=None) - timedelta(seconds=FETCH_RUN_STALE_AFTER)
+    if run_status == RUNNING and run['HEARTBEAT_DATETIME'] and run['HEARTBEAT_DATETIME'].replace(tzinfo=None) < stale_before:
+        run_status = INTERRUPTED
+    return {
+        'run_id': run_id,
+        'status': run_status,
+        'started_at': run['STARTED_DATETIME'].isoformat() if run['STARTED_DATETIME'] else None,
+        'finished_at': run['FINISHED_DATETIME'].isoformat() if run['FINISHED_DATETIME'] else None,
+        'configs_total': run['CONFIGS_TOTAL'],
+        'configs_done': run['CONFIGS_DONE'],
+        'rows_inserted': run['ROWS_INSERTED'],
+        'duplicates_skipped': run['DUPLICATES_SKIPPED'],
+        'errors': errors,
+    }
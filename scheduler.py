@@ -0,0 +1,198 @@
+# scheduler.py
+
+import heapq
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+
+from config import SCHEDULER_RELOAD_INTERVAL, SCHEDULER_MAX_CONFIGS_PER_RUN, SCHEDULER_SPLAY_SECONDS, FETCH_CONCURRENCY
+from cron import CronExpression, CronError
+from db_pool import pooled_connection
+from query_cache import invalidate_tables
+from run_ledger import FetchRunActive
+from script_02 import fetch_results_and_update_config
+import status
+from log_utils import get_logger
+
+log = get_logger('scheduler')
+
+# Schedule used when a config has no CRON_LOGIC
+FREQUENCY_CRON = {
+    'HOURLY': '0 * * * *',
+    'DAILY': '0 0 * * *',
+    'WEEKLY': '0 0 * * 0',
+    'MONTHLY': '0 0 1 * *',
+}
+
+SCHEDULE_QUERY = """
+    SELECT ID, FREQUENCY, CRON_LOGIC, START_DATE, END_DATE, LIVE_PROCESS_STATUS, LIVE_PROCESS_STATUS_UPDATED_DATETIME
+    FROM STRL_QUEUE_CONFIG
+    WHERE IS_ACTIVE_STATUS = 'Y'
+"""
+
+
+def as_utc(value):
+    """A START_DATE / END_DATE / timestamp column value as an aware UTC datetime, or None."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, datetime.min.time())
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def schedule_for(cron_logic, frequency):
+    """The config's CronExpression: CRON_LOGIC if set, otherwise the one implied by FREQUENCY."""
+    expression = (cron_logic or '').strip() or FREQUENCY_CRON.get((frequency or '').strip().upper())
+    if not expression:
+        raise CronError(f"No CRON_LOGIC and unknown FREQUENCY {frequency!r}")
+    return CronExpression(expression)
+
+
+def splay(config_id):
+    """A stable per-config delay so configs sharing a schedule (e.g. midnight) do not all start at once."""
+    return timedelta(seconds=zlib.crc32(str(config_id).encode()) % (SCHEDULER_SPLAY_SECONDS + 1))
+
+
+def next_due(row, now):
+    """
+    When the config should next be fetched, or None if it should not be scheduled.
+    - Processing configs (new, or sent back for a re-pull) are due as soon as their window opens.
+    - Fetched configs are due at the first cron time after their last fetch.
+    - Configs still waiting for a priority are skipped, as are errored ones (the reprocess engine
+      retries those with backoff); nothing is scheduled past END_DATE.
+    """
+    cron = schedule_for(row['CRON_LOGIC'], row['FREQUENCY'])
+    start, end = as_utc(row['START_DATE']), as_utc(row['END_DATE'])
+    # The add form stores "now" in both dates when they are left blank: that means no end date
+    if start is not None and end is not None and end <= start:
+        end = None
+
+    live_status = row['LIVE_PROCESS_STATUS']
+    if live_status == status.PROCESSING:
+        due = max(now, start) if start else now
+    elif live_status == status.FETCHED:
+        last = as_utc(row['LIVE_PROCESS_STATUS_UPDATED_DATETIME']) or now
+        if start is not None and start > last:
+            # First fire at or after the start of the window
+            last = start - timedelta(minutes=1)
+        fire = cron.next_after(last)
+        if fire is None:
+            return None
+        due = fire + splay(row['ID'])
+    else:
+        return None
+
+    if end is not None and due > end:
+        return None
+    return due
+
+
+class Scheduler:
+    """
+    Runs fetches for configs when their CRON_LOGIC says they are due.
+    Next-due times are kept in a min-heap of (due, config_id). Each pass pops up to
+    SCHEDULER_MAX_CONFIGS_PER_RUN due configs and fetches only those; the rest stay due
+    for the next pass. The heap is rebuilt from STRL_QUEUE_CONFIG after every run and
+    every SCHEDULER_RELOAD_INTERVAL seconds, so edits and fetch outcomes are picked up.
+    """
+
+    def __init__(self, max_configs_per_run=SCHEDULER_MAX_CONFIGS_PER_RUN, reload_interval=SCHEDULER_RELOAD_INTERVAL,
+                 concurrency=FETCH_CONCURRENCY):
+        self._max_configs_per_run = max_configs_per_run
+        self._reload_interval = reload_interval
+        self._concurrency = concurrency
+        self._heap = []
+        self._loaded_at = None
+        self._last_run = {}  # config_id -> when this scheduler last ran it
+
+    def load(self, now):
+        """Rebuilds the heap from the active configs."""
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(SCHEDULE_QUERY)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            cursor.close()
+
+        heap = []
+        for row in rows:
+            try:
+                due = next_due(row, now)
+            except (CronError, ValueError) as e:
+                log.warning("Config %s is not scheduled: %s", row['ID'], e, extra={'config_id': row['ID']})
+                continue
+            if due is None:
+                continue
+            # A config that did not leave Processing (e.g. skipped) is retried at most once per reload interval
+            last_run = self._last_run.get(row['ID'])
+            if last_run is not None:
+                due = max(due, last_run + timedelta(seconds=self._reload_interval))
+            heap.append((due, row['ID']))
+        heapq.heapify(heap)
+        self._heap = heap
+        self._loaded_at = now
+        log.info("Scheduler loaded %d scheduled configs", len(heap))
+
+    def pop_due(self, now):
+        """Removes and returns the IDs of up to max_configs_per_run configs that are due, earliest first."""
+        config_ids = []
+        while self._heap and self._heap[0][0] <= now and len(config_ids) < self._max_configs_per_run:
+            config_ids.append(heapq.heappop(self._heap)[1])
+        return config_ids
+
+    def run_due(self, now):
+        """Fetches the configs that are due. Returns the per-config results."""
+        config_ids = self.pop_due(now)
+        if not config_ids:
+            return []
+        log.info("Scheduler running %d due configs", len(config_ids), extra={'config_count': len(config_ids)})
+        self._last_run.update((config_id, now) for config_id in config_ids)
+
+        # Fetched configs that are due again go back to Processing so the fetch run picks them up
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            status.transition(cursor, status.PROCESSING, config_ids, from_statuses=[status.FETCHED])
+            conn.commit()
+            cursor.close()
+        invalidate_tables("STRL_QUEUE_CONFIG")
+
+        try:
+            return fetch_results_and_update_config(self._concurrency, config_ids=config_ids)
+        except FetchRunActive:
+            # Another process is fetching; the configs stay Processing and its run or the next pass picks them up
+            return []
+        finally:
+            # Fetch outcomes move the next-due times
+            self._loaded_at = None
+
+    def seconds_until_next(self, now):
+        wake = self._loaded_at + timedelta(seconds=self._reload_interval)
+        if self._heap:
+            wake = min(wake, self._heap[0][0])
+        return max(1, (wake - now).total_seconds())
+
+    def run_forever(self):
+        log.info("Scheduler started")
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                if self._loaded_at is None or (now - self._loaded_at).total_seconds() >= self._reload_interval:
+                    self.load(now)
+                self.run_due(now)
+            except Exception as e:
+                log.exception("Scheduler pass failed: %s", e)
+                self._loaded_at = None
+                time.sleep(self._reload_interval)
+                continue
+            if self._loaded_at is None:
+                # A run just finished: reload straight away to pick up configs that are still due
+                continue
+            time.sleep(self.seconds_until_next(datetime.now(timezone.utc)))
+
+
+if __name__ == '__main__':
+    Scheduler().run_forever()
@@ -1,31 +1,62 @@
-from config import get_snowflake_connection
+from db_pool import pooled_connection, values_relation
+from query_cache import invalidate_tables
+from config import PRIORITY_COMPACTION_RATIO, PRIORITY_UPDATE_CHUNK_SIZE
+import status
+from log_utils import get_logger
 from datetime import datetime, timezone
 import pandas as pd
-from collections import namedtuple
+import hashlib
+import re
 
-def check_duplicate_config(cursor, configs):
-    """Check for duplicate configurations and prepare updates if found, with case-insensitive comparison."""
-    duplicate_updates = []
+log = get_logger('script_01')
 
-    for config in configs:
-        # Check for duplicate entries in the database with case-insensitive comparison
-        cursor.execute("""
-            SELECT ID FROM strl_queue_config
-            WHERE SOURCE_ID = %s 
-              AND SCRIPT_ID = %s 
-              AND QUERY_STRING ILIKE %s 
-              AND IS_ACTIVE_STATUS = 'Y'
-        """, (config.source_id, config.script_id, config.query_string))
+# Active configs sharing (SOURCE_ID, SCRIPT_ID, QUERY_HASH); the lowest ID in each group is the original
+DUPLICATE_CONFIGS_QUERY = """
+    SELECT ID, ORIGINAL_ID
+    FROM (
+        SELECT ID, MIN(ID) OVER (PARTITION BY SOURCE_ID, SCRIPT_ID, QUERY_HASH) AS ORIGINAL_ID
+        FROM STRL_QUEUE_CONFIG
+        WHERE IS_ACTIVE_STATUS = 'Y'
+          AND QUERY_HASH IS NOT NULL
+    )
+    WHERE ID != ORIGINAL_ID
+"""
+
+def normalize_query(query_string: str) -> str:
+    """Collapses whitespace and lower-cases a query so formatting-only differences compare equal."""
+    return re.sub(r'\s+', ' ', query_string).strip().lower()
+
+def query_hash(query_string: str) -> str:
+    """
+    SHA-256 of the normalized query, stored in STRL_QUEUE_CONFIG.QUERY_HASH.
+    Matches SHA2(LOWER(TRIM(REGEXP_REPLACE(QUERY_STRING, '\\s+', ' '))), 256) on the warehouse side.
+    """
+    return hashlib.sha256(normalize_query(query_string).encode('utf-8')).hexdigest()
 
-        duplicate = cursor.fetchone()
+def check_duplicate_config(cursor):
+    """Find every duplicate active configuration in one pass, returning (original_id, duplicate_id) pairs."""
+    cursor.execute(DUPLICATE_CONFIGS_QUERY)
+    duplicate_updates = [(original_id, config_id) for config_id, original_id in cursor.fetchall()]
 
-        if duplicate and duplicate[0] != config.id:
-            duplicate_updates.append((duplicate[0], config.id))
-            print(f"Duplicate config found: {config.id} marked as inactive, original config: {duplicate[0]} ")
+    for original_id, config_id in duplicate_updates:
+        log.debug("Duplicate config found: %s marked as inactive, original config: %s", config_id, original_id,
+                  extra={'config_id': config_id, 'original_id': original_id, 'sample': 100})
+    if duplicate_updates:
+        log.info("%d duplicate configs found", len(duplicate_updates))
 
-    # Return list of duplicates to update
     return duplicate_updates
 
+def deactivate_duplicate_configs(cursor) -> int:
+    """Deactivate all duplicate configurations with a single statement and return the number of rows updated."""
+    cursor.execute(f"""
+        UPDATE STRL_QUEUE_CONFIG c
+        SET IS_ACTIVE_STATUS = 'N', LAST_UPDATED_DATETIME = CONVERT_TIMEZONE('UTC', CURRENT_TIMESTAMP()),
+            ERROR_STRING = 'Duplicate config detected', ERROR_DESC = 'Original config ID is ' || d.ORIGINAL_ID
+        FROM ({DUPLICATE_CONFIGS_QUERY}) d
+        WHERE c.ID = d.ID
+    """)
+    return cursor.rowcount
+
 def are_priorities_unique(cursor):
     """Check if all active configurations have unique priorities."""
     cursor.execute("""
@@ -39,7 +70,7 @@ def are_priorities_unique(cursor):
     non_unique_priorities = cursor.fetchall()
     
     if non_unique_priorities:
-        print("Non-unique priorities found. Need to adjust priorities.")
+        log.info("Non-unique priorities found. Need to adjust priorities.")
         return False
 
     return True
@@ -58,7 +89,7 @@ def custom_sort_dataframe(df: pd.DataFrame) -> pd.DataFrame:
             'IS_PRIORITY_UPDATED'
         ],
         key=lambda col: (
-            col.map({'Y': 0, 'N': 1, 'Assign_priority_pending': 0, 'Processing': 1})
+            col.map({'Y': 0, 'N': 1, status.ASSIGN_PRIORITY_PENDING: 0, status.PROCESSING: 1})
             if col.name in ['LIVE_PROCESS_STATUS', 'IS_PRIORITY_UPDATED']
             else col.replace(0, float('inf'))
         )
@@ -82,162 +113,181 @@ def assign_priorities(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
+def rebalance_priorities(df: pd.DataFrame, floor: int = 0) -> pd.DataFrame:
+    """
+    Resolves priority collisions with the fewest moves, for a DataFrame already sorted by custom_sort_dataframe.
+    - Each config keeps its priority unless it collides with the config ordered before it,
+      in which case it is pushed to the next free slot.
+    - Priority 0 (unassigned) configs are appended after the highest priority.
+    - Gaps left by deleted or deactivated configs are kept, so a push only ripples down to the next gap.
+    `floor` is the highest priority below the rows in `df` that is already taken.
+    """
+    new_priorities = []
+    last_priority = floor
+    for priority in df['PRIORITY']:
+        if priority <= last_priority:
+            priority = last_priority + 1
+        new_priorities.append(priority)
+        last_priority = priority
+
+    df['PRIORITY'] = new_priorities
+    return df
+
+def changed_priorities(old_df: pd.DataFrame, new_df: pd.DataFrame):
+    """Returns the rows of old_df and new_df whose PRIORITY differs between them."""
+    old_priority = old_df.set_index('CONFIG_ID')['PRIORITY']
+    new_priority = new_df.set_index('CONFIG_ID')['PRIORITY']
+    changed_ids = new_priority.index[new_priority != old_priority.reindex(new_priority.index)]
+    return old_df[old_df['CONFIG_ID'].isin(changed_ids)], new_df[new_df['CONFIG_ID'].isin(changed_ids)]
+
+def lowest_conflicting_priority(cursor):
+    """Returns the lowest non-zero priority held by more than one active config, or None."""
+    cursor.execute("""
+        SELECT MIN(PRIORITY)
+        FROM (
+            SELECT PRIORITY
+            FROM STRL_QUEUE_CONFIG
+            WHERE IS_ACTIVE_STATUS = 'Y' AND PRIORITY > 0
+            GROUP BY PRIORITY
+            HAVING COUNT(*) > 1
+        )
+    """)
+    result = cursor.fetchone()
+    return result[0] if result else None
+
 def log_priority_changes(old_df: pd.DataFrame, new_df: pd.DataFrame, updated_by: str, cursor) -> None:
     """
     Compares two DataFrames and logs priority changes, and updates the database with new priorities.
+    The changed (CONFIG_ID, NEW_PRIORITY) pairs are staged once as a VALUES list, and each table is
+    updated with one join per chunk rather than one statement per config.
     """
-    # Ensure both DataFrames are aligned by ID
-    old_df = old_df.set_index('CONFIG_ID')
-    new_df = new_df.set_index('CONFIG_ID')
-    
-    # Collect data for batch update
-    update_values = []
-    insert_values = []
-    additional_updates = []
+    # Align both DataFrames by ID and keep only real changes
+    changes = old_df[['CONFIG_ID', 'PRIORITY']].merge(
+        new_df[['CONFIG_ID', 'PRIORITY']], on='CONFIG_ID', suffixes=('_OLD', '_NEW')
+    )
+    changes = changes[changes['PRIORITY_OLD'] != changes['PRIORITY_NEW']]
     current_utc_timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-    print("Executing log of priority for configs")
-
-    for config_id in old_df.index:
-        old_priority = old_df.at[config_id, 'PRIORITY']
-        new_priority = new_df.at[config_id, 'PRIORITY']
-        live_process_status = old_df.at[config_id, 'LIVE_PROCESS_STATUS']
-        is_priority_updated = old_df.at[config_id, 'IS_PRIORITY_UPDATED']
-        
-        # Check for priority change
-        if old_priority != new_priority:
-            insert_values.append(
-                (config_id, old_priority, new_priority, updated_by, current_utc_timestamp)
-            )
-            update_values.append((
-                new_priority,
-                'Processing' if live_process_status == 'Assign_Priority_Pending' else live_process_status,
-                'N' if is_priority_updated == 'Y' else is_priority_updated,
-                config_id
-            ))
-
-            # Prepare additional updates for other tables
-            additional_updates.append((new_priority, config_id))
-
-            print(f"Priority auto-updated for config {config_id}: from {old_priority} to {new_priority}")
-        else: 
-            print(f"Priority {old_priority} is unique & unchanged.")
-
-    # Execute batch updates if there are any changes
-    if update_values:
+    log.debug("Executing log of priority for configs")
+
+    if changes.empty:
+        log.info("All priorities are unique & unchanged.")
+        return
+
+    for start in range(0, len(changes), PRIORITY_UPDATE_CHUNK_SIZE):
+        chunk = changes.iloc[start:start + PRIORITY_UPDATE_CHUNK_SIZE]
+        values_sql, params = values_relation(
+            [tuple(int(value) for value in row) for row in chunk[['CONFIG_ID', 'PRIORITY_OLD', 'PRIORITY_NEW']].itertuples(index=False)],
+            ['CONFIG_ID', 'OLD_PRIORITY', 'NEW_PRIORITY']
+        )
+
         # Update the STRL_QUEUE_CONFIG table
-        update_statement = """
-        UPDATE STRL_QUEUE_CONFIG 
-        SET PRIORITY = %s, LIVE_PROCESS_STATUS = %s, IS_PRIORITY_UPDATED = %s 
-        WHERE ID = %s
-        """
-        cursor.executemany(update_statement, update_values)
-        print("Batch update executed for priority changes in STRL_QUEUE_CONFIG.")
+        cursor.execute(f"""
+            UPDATE STRL_QUEUE_CONFIG c
+            SET PRIORITY = t.NEW_PRIORITY,
+                IS_PRIORITY_UPDATED = CASE WHEN c.IS_PRIORITY_UPDATED = 'Y' THEN 'N' ELSE c.IS_PRIORITY_UPDATED END
+            FROM {values_sql} t
+            WHERE c.ID = t.CONFIG_ID
+        """, params)
 
         # Update the STRL_PAYLOAD_MASTER table
-        update_payload_statement = """
-        UPDATE STRL_PAYLOAD_MASTER
-        SET PRIORITY = %s
-        WHERE CONFIG_ID = %s
-        """
-        cursor.executemany(update_payload_statement, additional_updates)
-        print("Batch update executed for priority changes in STRL_PAYLOAD_MASTER.")
+        cursor.execute(f"""
+            UPDATE STRL_PAYLOAD_MASTER p
+            SET PRIORITY = t.NEW_PRIORITY
+            FROM {values_sql} t
+            WHERE p.CONFIG_ID = t.CONFIG_ID
+        """, params)
 
         # Update the STRL_QUEUE_MASTER table
-        update_queue_master_statement = """
-        UPDATE STRL_QUEUE_MASTER
-        SET PRIORITY = %s
-        WHERE CONFIG_ID = %s
-        """
-        cursor.executemany(update_queue_master_statement, additional_updates)
-        print("Batch update executed for priority changes in STRL_QUEUE_MASTER.")
-
-        # # Update the STRL_QUEUE_REPROCESS table
-        # update_queue_reprocess_statement = """
-        # UPDATE STRL_QUEUE_REPROCESS
-        # SET PRIORITY = %s
-        # WHERE CONFIG_ID = %s
-        # """
-        # cursor.executemany(update_queue_reprocess_statement, additional_updates)
-        # print("Batch update executed for priority changes in STRL_QUEUE_REPROCESS.")
-
-    # Execute batch insert for priority logs
-    if insert_values:
-        insert_statement = """
-        INSERT INTO STRL_PRIORITY_LOG (CONFIG_ID, OLD_PRIORITY, NEW_PRIORITY, UPDATED_BY, UPDATED_DATETIME) 
-        VALUES (%s, %s, %s, %s, %s)
-        """
-        cursor.executemany(insert_statement, insert_values)
-        print("Batch insert executed for priority logs.")
-
-# Define the namedtuple with all the required fields
-Config = namedtuple('Config', [
-    'id', 'script_id', 'source_id', 'source_name', 'query_string', 'is_active_status'
-])
+        cursor.execute(f"""
+            UPDATE STRL_QUEUE_MASTER q
+            SET PRIORITY = t.NEW_PRIORITY
+            FROM {values_sql} t
+            WHERE q.CONFIG_ID = t.CONFIG_ID
+        """, params)
+
+        # Insert the priority logs
+        cursor.execute(f"""
+            INSERT INTO STRL_PRIORITY_LOG (CONFIG_ID, OLD_PRIORITY, NEW_PRIORITY, UPDATED_BY, UPDATED_DATETIME)
+            SELECT t.CONFIG_ID, t.OLD_PRIORITY, t.NEW_PRIORITY, %s, %s
+            FROM {values_sql} t
+        """, [updated_by, current_utc_timestamp] + params)
+
+    log.info("Priority auto-updated for %d configs in STRL_QUEUE_CONFIG, STRL_PAYLOAD_MASTER and STRL_QUEUE_MASTER.", len(changes))
+
+def release_pending_configs(cursor):
+    """Every config now has its final priority, so configs waiting for one become ready to fetch."""
+    released = status.transition(cursor, status.PROCESSING, from_statuses=[status.ASSIGN_PRIORITY_PENDING])
+    log.info("%d configs moved from %s to %s.", released, status.ASSIGN_PRIORITY_PENDING, status.PROCESSING)
 
 def update_priorities():
-    conn = get_snowflake_connection()
-    try:
-        with conn.cursor() as cursor:
-            print("Starting priority update process...")
-
-            # Fetch all configurations
-            cursor.execute("""
-                SELECT ID, SCRIPT_ID, SOURCE_ID, SOURCE_NAME, QUERY_STRING, IS_ACTIVE_STATUS 
-                FROM strl_queue_config
-            """)
-            configs = cursor.fetchall()
-            print(f"Fetched {len(configs)} configurations from the database.")
-
-            configs = [Config(*config) for config in configs]
-
-            # Check for duplicates
-            duplicate_updates = check_duplicate_config(cursor, configs)
-
-            if duplicate_updates:
-                cursor.executemany("""
-                    UPDATE strl_queue_config 
-                    SET IS_ACTIVE_STATUS = 'N', LAST_UPDATED_DATETIME = CONVERT_TIMEZONE('UTC', CURRENT_TIMESTAMP()), 
-                        ERROR_STRING = 'Duplicate config detected', ERROR_DESC = 'Original config ID is %s' 
-                    WHERE ID = %s
-                """, duplicate_updates)
-                print(f"{len(duplicate_updates)} Duplicate configs deactivated.")
-
-            # Check if priorities are unique
-            if are_priorities_unique(cursor):
-                print("All active configs have unique priorities. No further action needed.")
-                return  # Exit function if no further action is needed
-
-            # Fetch all active configurations for priority updates
-            cursor.execute("""
-                SELECT ID, PRIORITY, IS_PRIORITY_UPDATED, LIVE_PROCESS_STATUS 
-                FROM STRL_QUEUE_CONFIG 
-                WHERE IS_ACTIVE_STATUS = 'Y'
-            """)
-            configs = cursor.fetchall()
-
-            old_df = pd.DataFrame(configs, columns=['CONFIG_ID', 'PRIORITY', 'IS_PRIORITY_UPDATED', 'LIVE_PROCESS_STATUS'])
-
-            print("Initial active configurations:", old_df)  
-
-            df = custom_sort_dataframe(old_df)
-
-            print("Sorted configurations:", df)  
-
-            new_df = assign_priorities(df)
-
-            print("Updated configurations:", new_df)  
-
-            # Log changes and update the database
-            log_priority_changes(old_df, new_df, updated_by='system', cursor=cursor)
-
-            # Commit changes
-            conn.commit()
-    except Exception as e:
-        print(f"An error occurred while updating priorities: {e}")
-        conn.rollback()
-    finally:
-        if conn:
-            conn.close()
+    """Rebalances config priorities and releases pending configs. Returns False if the update failed and was rolled back."""
+    with pooled_connection() as conn:
+        try:
+            with conn.cursor() as cursor:
+                log.info("Starting priority update process...")
+
+                # Check for duplicates
+                duplicate_updates = check_duplicate_config(cursor)
+
+                if duplicate_updates:
+                    deactivated = deactivate_duplicate_configs(cursor)
+                    log.info("%d Duplicate configs deactivated.", deactivated)
+
+                # Check if priorities are unique
+                if are_priorities_unique(cursor):
+                    log.info("All active configs have unique priorities. No further action needed.")
+                    release_pending_configs(cursor)
+                    conn.commit()
+                    invalidate_tables("STRL_QUEUE_CONFIG")
+                    return True  # Exit function if no further action is needed
+
+                cursor.execute("""
+                    SELECT COUNT(*), COALESCE(MAX(PRIORITY), 0)
+                    FROM STRL_QUEUE_CONFIG
+                    WHERE IS_ACTIVE_STATUS = 'Y'
+                """)
+                active_count, max_priority = cursor.fetchone()
+
+                columns = ['CONFIG_ID', 'PRIORITY', 'IS_PRIORITY_UPDATED', 'LIVE_PROCESS_STATUS']
+                if max_priority > active_count * PRIORITY_COMPACTION_RATIO:
+                    # Too many gaps have built up: renumber every active config 1..N
+                    log.info("Compacting priorities: max priority %s for %s active configs.", max_priority, active_count)
+                    cursor.execute("""
+                        SELECT ID, PRIORITY, IS_PRIORITY_UPDATED, LIVE_PROCESS_STATUS 
+                        FROM STRL_QUEUE_CONFIG 
+                        WHERE IS_ACTIVE_STATUS = 'Y'
+                    """)
+                    old_df = pd.DataFrame(cursor.fetchall(), columns=columns)
+                    new_df = assign_priorities(custom_sort_dataframe(old_df))
+                else:
+                    # Only configs at or below the first collision, plus unassigned ones, can move
+                    start_priority = lowest_conflicting_priority(cursor)
+                    if start_priority is None:
+                        start_priority = max_priority + 1
+                    cursor.execute("""
+                        SELECT ID, PRIORITY, IS_PRIORITY_UPDATED, LIVE_PROCESS_STATUS 
+                        FROM STRL_QUEUE_CONFIG 
+                        WHERE IS_ACTIVE_STATUS = 'Y'
+                          AND (PRIORITY >= %s OR PRIORITY = 0)
+                    """, (start_priority,))
+                    old_df = pd.DataFrame(cursor.fetchall(), columns=columns)
+                    new_df = rebalance_priorities(custom_sort_dataframe(old_df), floor=start_priority - 1)
+
+                old_df, new_df = changed_priorities(old_df, new_df)
+                log.info("%d configs need a new priority.", len(new_df))
+
+                # Log changes and update the database
+                log_priority_changes(old_df, new_df, updated_by='system', cursor=cursor)
+                release_pending_configs(cursor)
+
+                # Commit changes
+                conn.commit()
+                invalidate_tables("STRL_QUEUE_CONFIG", "STRL_PAYLOAD_MASTER", "STRL_QUEUE_MASTER", "STRL_PRIORITY_LOG")
+                return True
+        except Exception as e:
+            log.exception("An error occurred while updating priorities: %s", e)
+            conn.rollback()
+            return False
 
 if __name__ == '__main__':
     update_priorities()
@@ -1,151 +1,565 @@
 import datetime
+import hashlib
 import json
 from snowflake.connector import connect, DictCursor
-from email_utils import notify_subscribers, notify_developers
-from config import get_snowflake_connection
+from snowflake.connector.errors import ProgrammingError
+from email_utils import notify_subscribers, notify_developers, EmailDigest
+from db_pool import pooled_connection, statement_timeout
+from query_cache import invalidate_tables
+import preflight
+from log_utils import get_logger, log_context
+import status
+import run_ledger
+from run_ledger import FetchRun, FetchRunActive
+from config import (
+    FETCH_PUSHDOWN, FETCH_BATCH_SIZE, FETCH_PUBLISH_SLICE_ROWS, FETCH_CONCURRENCY, FETCH_LARGE_CONCURRENCY, EMAIL_DIGEST_MODE,
+    FETCH_DEFAULT_TIMEOUT_SECONDS, FETCH_DEFAULT_MAX_ROWS, FETCH_DEFAULT_MAX_BYTES
+)
 import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+log = get_logger('script_02')
 
-def fetch_results_and_update_config():
+# Config columns a fetch run needs
+CONFIG_COLUMNS = """
+    ID, SCRIPT_ID, SOURCE_ID, SOURCE_NAME, QUERY_STRING, QUEUE_TYPE, PRIORITY,
+    CREATED_BY, START_DATE, LIVE_PROCESS_STATUS, MAXCOUNT_PER_DAY, ESTIMATED_BYTES, ESTIMATED_ROWS
+"""
+
+PAYLOAD_COLUMNS = """
+    SOURCE_ID, SCRIPT_ID, CONFIG_ID, PRIORITY, PAYLOAD_INPUT, CREATED_BY, QUEUE_DATE,
+    IS_QUEUED, IS_AGGREGATED, IS_PARSED, LAST_UPDATED_DATETIME, IS_ACTIVE_STATUS
+"""
+
+
+# Per-config fetch limits, set on STRL_QUEUE_CONFIG or STRL_SOURCE_MASTER, with their global defaults
+FETCH_LIMIT_DEFAULTS = {
+    'FETCH_TIMEOUT_SECONDS': FETCH_DEFAULT_TIMEOUT_SECONDS,
+    'FETCH_MAX_ROWS': FETCH_DEFAULT_MAX_ROWS,
+    'FETCH_MAX_BYTES': FETCH_DEFAULT_MAX_BYTES,
+}
+
+# Snowflake error numbers for a statement cancelled by a cancel request (604) or by STATEMENT_TIMEOUT_IN_SECONDS (630)
+CANCELLED_ERRNOS = (604, 630)
+
+
+class FetchLimitExceeded(Exception):
+    """Raised when a config's query passes one of its fetch limits."""
+
+
+def attach_fetch_limits(cursor, configs):
+    """
+    Sets FETCH_TIMEOUT_SECONDS, FETCH_MAX_ROWS and FETCH_MAX_BYTES on each config dict: the config's own
+    value, else its source's, else the default from config.py. `cursor` must be a DictCursor.
+    """
+    config_ids = [config['ID'] for config in configs if config.get('ID')]
+    limits = {}
+    if config_ids:
+        cursor.execute(f"""
+            SELECT c.ID, {", ".join(f"COALESCE(c.{column}, s.{column}) AS {column}" for column in FETCH_LIMIT_DEFAULTS)}
+            FROM STRL_QUEUE_CONFIG c
+            LEFT JOIN STRL_SOURCE_MASTER s ON s.ID = c.SOURCE_ID
+            WHERE c.ID IN ({", ".join(["%s"] * len(config_ids))})
+        """, config_ids)
+        limits = {row['ID']: row for row in cursor.fetchall()}
+    for config in configs:
+        row = limits.get(config.get('ID'), {})
+        for column, default in FETCH_LIMIT_DEFAULTS.items():
+            config[column] = default if row.get(column) is None else row[column]
+    return configs
+
+
+def check_fetch_limits(config, rows, size):
+    """Raises FetchLimitExceeded once `rows` rows or `size` bytes of payload pass the config's caps."""
+    max_rows, max_bytes = config.get('FETCH_MAX_ROWS'), config.get('FETCH_MAX_BYTES')
+    if max_rows and rows > max_rows:
+        raise FetchLimitExceeded(f"Query for config ID {config['ID']} returned more than FETCH_MAX_ROWS ({max_rows}) rows")
+    if max_bytes and size > max_bytes:
+        raise FetchLimitExceeded(f"Query for config ID {config['ID']} produced more than FETCH_MAX_BYTES ({max_bytes}) bytes of payloads")
+
+
+def payload_fields(config):
+    """Column values shared by every payload row of a config."""
+    return {
+        'SOURCE_ID': config['SOURCE_ID'],
+        'SCRIPT_ID': config['SCRIPT_ID'],
+        'CONFIG_ID': config['ID'],
+        'PRIORITY': config['PRIORITY'],
+        'CREATED_BY': config['CREATED_BY'],
+        'QUEUE_DATE': datetime.datetime.now(datetime.timezone.utc),  # UTC timestamp
+        'IS_QUEUED': 'N',
+        'IS_AGGREGATED': 'N',
+        'IS_PARSED': 'N',
+        'IS_ACTIVE_STATUS': 'Y',
+        'LAST_UPDATED_DATETIME': datetime.datetime.now(datetime.timezone.utc)  # UTC timestamp
+    }
+
+
+def as_subquery(query_string):
+    """Prepares a config's QUERY_STRING for use as a subquery in a parameterized statement."""
+    query_string = query_string.strip().rstrip(';').strip()
+    # Literal % signs would otherwise be read as bind placeholders
+    return query_string.replace('%', '%%')
+
+
+# Persistent (transient) staging table, keyed by run and config: every fetch path lands rows here,
+# then publish_staged_payloads moves the ones not already loaded for the config into STRL_PAYLOAD_MASTER.
+# Staged rows survive a crash, so a later run can resume publishing instead of re-running the query.
+PAYLOAD_STAGE_TABLE = 'STRL_PAYLOAD_STAGE'
+
+
+def stage_payloads_pushdown(cursor, config, run_id):
+    """
+    Builds the payload JSON inside the warehouse with a single INSERT ... SELECT into the staging
+    table, so results never travel to this process. The SELECT is limited to one row past
+    FETCH_MAX_ROWS, so the warehouse stops early on an oversized result, and a running byte total
+    keeps at most one row past FETCH_MAX_BYTES, so an oversized result is never staged in full.
+    (The window still reads the whole result; FETCH_TIMEOUT_SECONDS bounds that work.)
+    Returns the number of rows staged.
+    """
+    max_rows, max_bytes = config.get('FETCH_MAX_ROWS'), config.get('FETCH_MAX_BYTES')
+    params = {'RUN_ID': run_id, 'CONFIG_ID': config['ID'], 'MAX_BYTES': max_bytes}
+    # Keeps rows while the bytes before them are within the cap
+    byte_cap = (
+        "QUALIFY SUM(OCTET_LENGTH(PAYLOAD_INPUT)) OVER (ORDER BY SEQ ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)"
+        " - OCTET_LENGTH(PAYLOAD_INPUT) <= %(MAX_BYTES)s"
+    ) if max_bytes else ""
+    cursor.execute(f"""
+        INSERT INTO {PAYLOAD_STAGE_TABLE} (RUN_ID, CONFIG_ID, SEQ, PAYLOAD_INPUT)
+        SELECT %(RUN_ID)s, %(CONFIG_ID)s, SEQ, PAYLOAD_INPUT
+        FROM (
+            SELECT SEQ8() AS SEQ, TO_JSON(OBJECT_CONSTRUCT_KEEP_NULL(*)) AS PAYLOAD_INPUT
+            FROM ({as_subquery(config['QUERY_STRING'])})
+            {f"LIMIT {int(max_rows) + 1}" if max_rows else ""}
+        )
+        {byte_cap}
+    """, params)
+    staged = cursor.rowcount
+
+    size = 0
+    if max_bytes:
+        cursor.execute(f"""
+            SELECT COALESCE(SUM(OCTET_LENGTH(PAYLOAD_INPUT)), 0) AS STAGED_BYTES
+            FROM {PAYLOAD_STAGE_TABLE}
+            WHERE RUN_ID = %(RUN_ID)s AND CONFIG_ID = %(CONFIG_ID)s
+        """, params)
+        size = cursor.fetchone()['STAGED_BYTES']
+    # Over either cap the staged rows are uncommitted, and fail_config's rollback drops them
+    check_fetch_limits(config, staged, size)
+    return staged
+
+
+def stage_payloads_client_side(cursor, config, run_id, batch_size=FETCH_BATCH_SIZE):
+    """
+    Streams a config's results through Python in batches of `batch_size` rows and stages each
+    batch before reading the next, so memory use does not grow with the result size.
+    Reading stops at the first batch that takes the config past its row or byte cap.
+    Returns the number of rows staged.
+    """
+    config_id = config['ID']
+    staged = 0
+    size = 0
+
+    cursor.execute(config['QUERY_STRING'])
+    # Inserts need their own cursor so the open result set is not discarded
+    with cursor.connection.cursor() as write_cursor:
+        while True:
+            payloads = cursor.fetchmany(batch_size)
+            if not payloads:
+                break
+
+            # Convert each dictionary to a JSON string and batch insert into the staging table
+            rows = [(run_id, config_id, staged + i, json.dumps(payload)) for i, payload in enumerate(payloads)]
+            size += sum(len(row[3].encode('utf-8')) for row in rows)
+            check_fetch_limits(config, staged + len(rows), size)
+            write_cursor.executemany(
+                f"INSERT INTO {PAYLOAD_STAGE_TABLE} (RUN_ID, CONFIG_ID, SEQ, PAYLOAD_INPUT) VALUES (%s, %s, %s, %s)",
+                rows
+            )
+            staged += len(payloads)
+            log.debug("Staged %d payloads so far for config ID %s", staged, config_id, extra={'sample': 10})
+
+    return staged
+
+
+def stage_payloads(cursor, config, run_id):
+    """
+    Runs a config's query into the staging table, preferring push-down, under the config's
+    FETCH_TIMEOUT_SECONDS: the warehouse cancels a query that runs longer, and FetchLimitExceeded
+    is raised. Returns the number of rows staged.
+    """
+    timeout = config.get('FETCH_TIMEOUT_SECONDS')
     try:
-        # Connect to Snowflake
-        # logging.info("Script started")
-        print("Script started")
-        # logging.info("Connecting to Snowflake...")
-        print("Connecting to Snowflake...")
+        with statement_timeout(cursor, timeout):
+            if FETCH_PUSHDOWN:
+                try:
+                    return stage_payloads_pushdown(cursor, config, run_id)
+                except ProgrammingError as e:
+                    if e.errno in CANCELLED_ERRNOS:
+                        raise
+                    # e.g. a QUERY_STRING that cannot be wrapped as a subquery
+                    log.warning("Push-down failed for config ID %s, falling back to client-side fetch: %s", config['ID'], e)
+            return stage_payloads_client_side(cursor, config, run_id)
+    except ProgrammingError as e:
+        if e.errno in CANCELLED_ERRNOS:
+            raise FetchLimitExceeded(
+                f"Query for config ID {config['ID']} ran past FETCH_TIMEOUT_SECONDS ({timeout}s) and was cancelled"
+            ) from e
+        raise
+
+
+def publish_staged_payloads(cursor, config, run, row_offset=0, rows_inserted=0):
+    """
+    Inserts the config's staged payloads into STRL_PAYLOAD_MASTER in slices of FETCH_PUBLISH_SLICE_ROWS
+    staged rows, from SEQ `row_offset` on. SEQ8() leaves gaps, so each slice ends at the last SEQ of the
+    next FETCH_PUBLISH_SLICE_ROWS staged rows rather than at a fixed SEQ range. Payloads whose
+    PAYLOAD_HASH is already present for the config (or repeated within the slice) are skipped. Each
+    slice is removed from the stage and committed with its checkpoint, so an interrupted publish
+    resumes at the next slice.
+    PAYLOAD_HASH is the SHA-256 of the canonical JSON: re-serializing the parsed payload gives the same
+    text whichever fetch path produced it. Returns the total number of new rows.
+    """
+    config_id = config['ID']
+    params = dict(payload_fields(config), RUN_ID=run.run_id, SLICE_ROWS=FETCH_PUBLISH_SLICE_ROWS)
+    while True:
+        params['LOWER'] = row_offset
+        cursor.execute(f"""
+            SELECT MAX(SEQ) AS UPPER FROM (
+                SELECT SEQ FROM {PAYLOAD_STAGE_TABLE}
+                WHERE RUN_ID = %(RUN_ID)s AND CONFIG_ID = %(CONFIG_ID)s AND SEQ >= %(LOWER)s
+                ORDER BY SEQ LIMIT %(SLICE_ROWS)s
+            )
+        """, params)
+        upper = cursor.fetchone()['UPPER']
+        if upper is None:
+            break
+
+        params['UPPER'] = upper
+        cursor.execute(f"""
+            INSERT INTO STRL_PAYLOAD_MASTER ({PAYLOAD_COLUMNS}, PAYLOAD_HASH)
+            SELECT %(SOURCE_ID)s, %(SCRIPT_ID)s, %(CONFIG_ID)s, %(PRIORITY)s, s.PAYLOAD_INPUT, %(CREATED_BY)s, %(QUEUE_DATE)s,
+                   %(IS_QUEUED)s, %(IS_AGGREGATED)s, %(IS_PARSED)s, %(LAST_UPDATED_DATETIME)s, %(IS_ACTIVE_STATUS)s, s.PAYLOAD_HASH
+            FROM (
+                SELECT PAYLOAD_INPUT, SHA2(TO_JSON(PARSE_JSON(PAYLOAD_INPUT)), 256) AS PAYLOAD_HASH
+                FROM {PAYLOAD_STAGE_TABLE}
+                WHERE RUN_ID = %(RUN_ID)s AND CONFIG_ID = %(CONFIG_ID)s AND SEQ BETWEEN %(LOWER)s AND %(UPPER)s
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY PAYLOAD_HASH ORDER BY SEQ) = 1
+            ) s
+            WHERE NOT EXISTS (
+                SELECT 1 FROM STRL_PAYLOAD_MASTER p
+                WHERE p.CONFIG_ID = %(CONFIG_ID)s AND p.PAYLOAD_HASH = s.PAYLOAD_HASH
+            )
+        """, params)
+        rows_inserted += cursor.rowcount
+        cursor.execute(f"""
+            DELETE FROM {PAYLOAD_STAGE_TABLE}
+            WHERE RUN_ID = %(RUN_ID)s AND CONFIG_ID = %(CONFIG_ID)s AND SEQ <= %(UPPER)s
+        """, params)
+        row_offset = upper + 1
+        run.checkpoint(cursor, config_id, run_ledger.STAGED, row_offset=row_offset, rows_inserted=rows_inserted)
+        cursor.connection.commit()
+    return rows_inserted
+
+
+def clear_staged_payloads(cursor, run_id, config_id):
+    cursor.execute(f"DELETE FROM {PAYLOAD_STAGE_TABLE} WHERE RUN_ID = %s AND CONFIG_ID = %s", (run_id, config_id))
+
+
+def copy_staged_payloads(cursor, run_id, from_config_id, to_config_id):
+    """Gives `to_config_id` its own copy of the rows staged for `from_config_id`, keeping their SEQ."""
+    cursor.execute(f"""
+        INSERT INTO {PAYLOAD_STAGE_TABLE} (RUN_ID, CONFIG_ID, SEQ, PAYLOAD_INPUT)
+        SELECT RUN_ID, %(TO_CONFIG_ID)s, SEQ, PAYLOAD_INPUT
+        FROM {PAYLOAD_STAGE_TABLE}
+        WHERE RUN_ID = %(RUN_ID)s AND CONFIG_ID = %(FROM_CONFIG_ID)s
+    """, {'RUN_ID': run_id, 'FROM_CONFIG_ID': from_config_id, 'TO_CONFIG_ID': to_config_id})
+
 
-        conn = get_snowflake_connection()
-        # logging.info("Connected to Snowflake")
-        print("Connected to Snowflake")
+def execution_key(query_string):
+    """
+    Key under which configs share one execution of their query within a run: runs of whitespace
+    outside quoted literals and identifiers collapse to one space, and a trailing ';' is dropped.
+    Unlike QUERY_HASH this keeps case, since 'abc' and 'ABC' literals return different rows.
+    """
+    key, quote, pending_space = [], None, False
+    for char in (query_string or '').strip().rstrip(';').strip():
+        if quote:
+            key.append(char)
+            if char == quote:
+                quote = None
+        elif char.isspace():
+            pending_space = True
+        else:
+            if pending_space and key:
+                key.append(' ')
+            pending_space = False
+            if char in ("'", '"'):
+                quote = char
+            key.append(char)
+    return ''.join(key)
 
-        # Get today's date in UTC
-        today = datetime.datetime.now(datetime.timezone.utc).date()
-        # logging.info(f"Today's date (UTC): {today}")
-        print(f"Today's date (UTC): {today}")
 
+def query_key(query_string):
+    """SHA-256 of execution_key, recorded with staged checkpoints so a resumed run only publishes rows of the current query."""
+    return hashlib.sha256(execution_key(query_string).encode('utf-8')).hexdigest()
+
+
+def group_by_query(configs):
+    """
+    Groups configs that would run the same query under the same fetch limits, keeping the order
+    of each group's first config.
+    """
+    groups = {}
+    for config in configs:
+        key = (execution_key(config.get('QUERY_STRING')),) + tuple(config.get(column) for column in FETCH_LIMIT_DEFAULTS)
+        groups.setdefault(key, []).append(config)
+    return list(groups.values())
+
+
+def stage_config_group(cursor, configs, run):
+    """
+    Stages payloads for configs sharing one query and commits them with 'staged' checkpoints.
+    Configs an interrupted or failed run left staged are resumed; for the rest the query runs once,
+    for the first of them, and its rows are copied to the others.
+    Returns {config ID: (rows fetched, row offset, rows inserted)}.
+    """
+    staged, to_stage = {}, []
+    key = query_key(configs[0]['QUERY_STRING'])
+    for config in configs:
+        resumed = run.adopt(cursor, config['ID'], PAYLOAD_STAGE_TABLE, key)
+        if resumed:
+            staged[config['ID']] = resumed
+        else:
+            to_stage.append(config)
+
+    if to_stage:
+        leader = to_stage[0]
+        log.info("Executing query for config ID %s: %s", leader['ID'], leader['QUERY_STRING'])
+        fetched = stage_payloads(cursor, leader, run.run_id)
+        for config in to_stage:
+            if config is not leader:
+                log.info("Config ID %s shares the query of config ID %s; reusing its %d rows", config['ID'], leader['ID'], fetched)
+                copy_staged_payloads(cursor, run.run_id, leader['ID'], config['ID'])
+            # Rows older runs left staged for this config are of no use any more
+            run.supersede(cursor, config['ID'], PAYLOAD_STAGE_TABLE)
+            run.checkpoint(
+                cursor, config['ID'], run_ledger.STAGED, rows_fetched=fetched, row_offset=0, rows_inserted=0, query_key=key
+            )
+            staged[config['ID']] = (fetched, 0, 0)
+
+    cursor.connection.commit()
+    return staged
+
+
+def publish_config(cursor, config, run, staged, digest=None):
+    """
+    Publishes a config's staged payloads from `staged` (rows fetched, row offset, rows inserted),
+    moves it to 'Fetched' and commits. Returns the config's result dict.
+    """
+    config_id = config['ID']
+    fetched, row_offset, rows_inserted = staged
+    inserted = publish_staged_payloads(cursor, config, run, row_offset, rows_inserted)
+    duplicates = fetched - inserted
+
+    # Only the new payloads join the queue, so they alone set the input count and the target days;
+    # rows skipped as already loaded were projected when they were first inserted
+    input_count = inserted
+    max_count_per_day = config.get('MAXCOUNT_PER_DAY')
+    target_days = math.ceil(input_count / max_count_per_day)
+
+    # Update config status and target days
+    moved = status.transition(cursor, status.FETCHED, [config_id], set_columns={
+        'INPUT_COUNT': input_count,
+        'TARGET_DAYS': target_days,
+        'FETCH_RETRY_COUNT': 0,
+    })
+    if not moved:
+        log.warning("Config %s changed status during the run; left as is", config_id)
+    run.supersede(cursor, config_id, PAYLOAD_STAGE_TABLE)
+    run.checkpoint(cursor, config_id, run_ledger.DONE)
+    cursor.connection.commit()
+
+    notify_subscribers(f"Config {config_id} Fetched", f"Config {config_id} has been fetched successfully: {fetched} records, {inserted} new, {duplicates} already loaded.", digest)
+    return {'config_id': config_id, 'status': status.FETCHED, 'rows': inserted, 'duplicates': duplicates, 'error': None}
+
+
+def fail_config(cursor, config, run, error, digest=None):
+    """Discards a config's uncommitted work, moves it to 'Error' and commits. Returns the config's result dict."""
+    config_id = config['ID']
+    error_msg = f"Error processing config ID {config_id}: {error}"
+    log.error(error_msg)
+    # Slices already committed stay published; the rest of this config's work is discarded
+    cursor.connection.rollback()
+    clear_staged_payloads(cursor, run.run_id, config_id)
+    status.transition(cursor, status.ERROR, [config_id], set_columns={'ERROR_STRING': str(error)})
+    run.checkpoint(cursor, config_id, run_ledger.ERROR)
+    cursor.connection.commit()
+    notify_developers(f"Error in Config {config_id}", error_msg, digest)
+    return {'config_id': config_id, 'status': status.ERROR, 'rows': 0, 'duplicates': 0, 'error': str(error)}
+
+
+def process_config_group(cursor, configs, run, digest=None):
+    """
+    Fetches payloads for configs that share a query (see group_by_query), running the query once.
+    Each config's outcome is recorded on STRL_QUEUE_CONFIG and committed on its own, with progress
+    checkpointed in `run` (a run_ledger.FetchRun). Notifications go to `digest` when one is given,
+    otherwise they are queued individually.
+    Returns one dict per config with the config ID, the resulting status, the new and duplicate row counts and any error.
+    """
+    results, runnable = [], []
+    for config in configs:
+        log.debug("Retrieved config: %s", config, extra={'config_id': config.get('ID')})
+        if config.get('ID') and config.get('QUERY_STRING'):
+            runnable.append(config)
+            continue
+        error_msg = f"QUERY_STRING is missing for config ID {config.get('ID')}"
+        log.error(error_msg, extra={'config_id': config.get('ID')})
+        notify_developers(f"Error in Config {config.get('ID')}", error_msg, digest)
+        results.append({'config_id': config.get('ID'), 'status': 'Skipped', 'rows': 0, 'duplicates': 0, 'error': error_msg})
+    if not runnable:
+        return results
+
+    # The group is identified by its query; per-config records below carry each config_id
+    with log_context(run_id=run.run_id, query_key=query_key(runnable[0]['QUERY_STRING']), config_count=len(runnable)):
+        try:
+            staged = stage_config_group(cursor, runnable, run)
+        except Exception as e:
+            # The shared query failed, so every config waiting on it fails with it
+            return results + [fail_config(cursor, config, run, e, digest) for config in runnable]
+
+    for config in runnable:
+        with log_context(run_id=run.run_id, config_id=config['ID']):
+            try:
+                results.append(publish_config(cursor, config, run, staged[config['ID']], digest))
+            except Exception as e:
+                results.append(fail_config(cursor, config, run, e, digest))
+    return results
+
+
+def process_config_group_on_own_connection(configs, run, digest=None):
+    """Runs process_config_group on a dedicated pooled connection."""
+    with pooled_connection() as conn:
         with conn.cursor(DictCursor) as cursor:
-            # Fetch configurations
-            query = """
-                SELECT ID, SCRIPT_ID, SOURCE_ID, SOURCE_NAME, QUERY_STRING, QUEUE_TYPE, PRIORITY, 
-                CREATED_BY, START_DATE, LIVE_PROCESS_STATUS, MAXCOUNT_PER_DAY
-                FROM STRL_QUEUE_CONFIG
-                WHERE LIVE_PROCESS_STATUS in ('Processing', 'Error')
-                AND IS_ACTIVE_STATUS = 'Y'
-                ORDER BY PRIORITY
-            """
-            # logging.debug(f"Executing query: {query}")
-            print(f"Executing query: {query}")
-
-            cursor.execute(query)
-            result = cursor.fetchall()
-            # logging.debug(f"Query result: {result}")
-            print(f"Query result: {result}")
-
-            configs = result
-            # logging.info(f"Fetched {len(configs)} configurations")
-            print(f"Fetched {len(configs)} configurations")
-
-            if not configs:
-                # logging.info("No configurations found for processing")
-                print("No configurations found for processing")
-
-            for config in configs:
-                # logging.info(f"Retrieved config: {config}")
-                print(f"Retrieved config: {config}")
-
-                config_id = config.get('ID')
-                query_string = config.get('QUERY_STRING')
-
-                if not config_id or not query_string:
-                    error_msg = f"QUERY_STRING is missing for config ID {config_id}"
-                    # logging.error(error_msg)
-                    print(error_msg)
-                    notify_developers(f"Error in Config {config_id}", error_msg)
-                    continue
+            return process_config_group(cursor, configs, run, digest)
 
-                try:
-                    # logging.info(f"Executing query for config ID {config_id}: {query_string}")
-                    print(f"Executing query for config ID {config_id}: {query_string}")
-                    cursor.execute(query_string)
-                    result = cursor.fetchall()
-                    payloads = result
-                    # logging.info(f"Query result for config ID {config_id}: {payloads}")
-                    print(f"Query result for config ID {config_id}: {payloads}")
-
-                    # Calculate target days based on input count and max count per day
-                    max_count_per_day = config.get('MAXCOUNT_PER_DAY')
-                    input_count = len(payloads)
-                    target_days = math.ceil(input_count / max_count_per_day)
-
-                    # Prepare data for batch insert into STRL_PAYLOAD_MASTER
-                    insert_data = []
-                    for payload in payloads:
-                        payload_json = json.dumps(payload)  # Convert dictionary to JSON string
-                        insert_data.append({
-                            'SOURCE_ID': config['SOURCE_ID'],
-                            'SCRIPT_ID': config['SCRIPT_ID'],
-                            'CONFIG_ID': config['ID'],
-                            'PRIORITY': config['PRIORITY'],
-                            'PAYLOAD_INPUT': payload_json,
-                            'CREATED_BY': config['CREATED_BY'],
-                            'QUEUE_DATE': datetime.datetime.now(datetime.timezone.utc),  # UTC timestamp
-                            'IS_QUEUED': 'N',
-                            'IS_AGGREGATED': 'N',
-                            'IS_PARSED': 'N',
-                            'IS_ACTIVE_STATUS': 'Y',
-                            'LAST_UPDATED_DATETIME': datetime.datetime.now(datetime.timezone.utc)  # UTC timestamp
-                        })
-
-                    # Batch insert payloads into STRL_PAYLOAD_MASTER
-                    cursor.executemany("""
-                        INSERT INTO STRL_PAYLOAD_MASTER (SOURCE_ID, SCRIPT_ID, CONFIG_ID, PRIORITY, PAYLOAD_INPUT, CREATED_BY, QUEUE_DATE, IS_QUEUED, IS_AGGREGATED, IS_PARSED, LAST_UPDATED_DATETIME, IS_ACTIVE_STATUS)
-                        VALUES (%(SOURCE_ID)s, %(SCRIPT_ID)s, %(CONFIG_ID)s, %(PRIORITY)s, %(PAYLOAD_INPUT)s, %(CREATED_BY)s, %(QUEUE_DATE)s, %(IS_QUEUED)s, %(IS_AGGREGATED)s, %(IS_PARSED)s, %(LAST_UPDATED_DATETIME)s, %(IS_ACTIVE_STATUS)s)
-                    """, insert_data)
-
-                    # Update config status and target days
-                    cursor.execute("""
-                        UPDATE STRL_QUEUE_CONFIG 
-                        SET LIVE_PROCESS_STATUS = 'Fetched', INPUT_COUNT = %(input_count)s, TARGET_DAYS = %(target_days)s, LAST_UPDATED_DATETIME = %(last_updated_datetime)s
-                        WHERE ID = %(config_id)s
-                    """, {
-                        'input_count': input_count,
-                        'target_days': target_days,
-                        'last_updated_datetime': datetime.datetime.now(datetime.timezone.utc),
-                        'config_id': config['ID']
-                    })
-
-                    notify_subscribers(f"Config {config_id} Fetched", f"Config {config_id} has been fetched successfully and updated with {len(payloads)} records.")
-                
-                except Exception as e:
-                    error_msg = f"Error processing config ID {config_id}: {e}"
-                    # logging.error(error_msg)
-                    print(error_msg)
-                    cursor.execute("""
-                        UPDATE STRL_QUEUE_CONFIG 
-                        SET LIVE_PROCESS_STATUS = 'Error', ERROR_STRING = %(error_string)s, LAST_UPDATED_DATETIME = %(last_updated_datetime)s
-                        WHERE ID = %(config_id)s
-                    """, {
-                        'error_string': str(e),
-                        'last_updated_datetime': datetime.datetime.now(datetime.timezone.utc),
-                        'config_id': config['ID']
-                    })
-                    notify_developers(f"Error in Config {config_id}", error_msg)
-
-        conn.commit()
-        # logging.info("All transactions committed successfully")
-        print("All transactions committed successfully")
+
+def process_configs_concurrently(configs, concurrency, run, progress=None, digest=None,
+                                 large_concurrency=FETCH_LARGE_CONCURRENCY):
+    """
+    Runs up to `concurrency` query groups at once. Groups with a config the pre-flight estimate marks
+    as large (see preflight.is_large) go to a separate lane of `large_concurrency` workers, so they
+    cannot hold every worker while smaller configs wait. With `large_concurrency` 0 there is no
+    separate lane: large groups share the `concurrency` workers, which then bound the whole pass.
+    Each executor's queue is FIFO, so groups start in the PRIORITY order of their first config.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        large_executor = ThreadPoolExecutor(max_workers=large_concurrency) if large_concurrency else executor
+        try:
+            futures = []
+            for group in group_by_query(configs):
+                lane = large_executor if any(preflight.is_large(config) for config in group) else executor
+                futures.append(lane.submit(process_config_group_on_own_connection, group, run, digest))
+            for future in as_completed(futures):
+                if progress:
+                    for result in future.result():
+                        progress.config_done(result)
+            return [result for future in futures for result in future.result()]
+        finally:
+            if large_executor is not executor:
+                large_executor.shutdown()
+
+
+def fetch_results_and_update_config(concurrency=FETCH_CONCURRENCY, progress=None, config_ids=None, run_id=None):
+    """
+    Fetches payloads for every active config in 'Processing' state, in PRIORITY order; errored configs
+    are re-fetched by the reprocess engine.
+    `config_ids`, if given, limits the run to those configs (the scheduler passes the ones that are due).
+    Configs whose queries are identical (see execution_key) share one execution of the query.
+    Each config is committed on its own and checkpointed in a run ledger (run_ledger.FetchRun), so a run
+    that is interrupted part way loses at most the config slice in flight; the next run resumes from there.
+    With concurrency > 1, up to that many query groups run at once, each on its own pooled connection;
+    groups are still admitted in PRIORITY order.
+    `progress`, if given, is told the number of configs (start) and each config's result (config_done).
+    `run_id`, if given, is the ID the run is recorded under in the ledger.
+    Returns the per-config results from process_config_group.
+    """
+    # In digest mode the run sends one summary email instead of one per config
+    digest = EmailDigest("STRL fetch run") if EMAIL_DIGEST_MODE else None
+    run = None
+    try:
+        log.info("Fetch run started")
+
+        with pooled_connection() as conn:
+
+            with conn.cursor(DictCursor) as cursor:
+                # Fetch configurations
+                query = f"""
+                    SELECT {CONFIG_COLUMNS}
+                    FROM STRL_QUEUE_CONFIG
+                    WHERE LIVE_PROCESS_STATUS IN ({", ".join(["%s"] * len(status.FETCHABLE))})
+                    AND IS_ACTIVE_STATUS = 'Y'
+                """
+                params = list(status.FETCHABLE)
+                if config_ids is not None:
+                    config_ids = list(config_ids) or [None]
+                    query += " AND ID IN (" + ", ".join(["%s"] * len(config_ids)) + ")"
+                    params += config_ids
+                query += " ORDER BY PRIORITY"
+                log.debug("Executing query: %s", query)
+
+                cursor.execute(query, params)
+                configs = cursor.fetchall()
+                log.info("Fetched %d configurations", len(configs), extra={'config_count': len(configs)})
+
+                if not configs:
+                    log.info("No configurations found for processing")
+                attach_fetch_limits(cursor, configs)
+
+                run = FetchRun.start([config['ID'] for config in configs], run_id)
+                log.info("Started fetch run %s", run.run_id, extra={'run_id': run.run_id})
+                if progress:
+                    progress.start(len(configs))
+
+                if concurrency <= 1:
+                    results = []
+                    for group in group_by_query(configs):
+                        group_results = process_config_group(cursor, group, run, digest)
+                        results.extend(group_results)
+                        if progress:
+                            for result in group_results:
+                                progress.config_done(result)
+
+        if concurrency > 1:
+            results = process_configs_concurrently(configs, concurrency, run, progress, digest)
+        run.finish(run_ledger.COMPLETED)
+
+        inserted = sum(result['rows'] for result in results)
+        duplicates = sum(result['duplicates'] for result in results)
+        log.info(
+            "All %d configs committed (%d at a time): %d new payloads inserted, %d duplicates skipped",
+            len(results), concurrency, inserted, duplicates,
+            extra={'run_id': run.run_id, 'inserted': inserted, 'duplicates': duplicates}
+        )
+        return results
+
+    except FetchRunActive as e:
+        # Another process is fetching; its run covers these configs
+        log.warning("Fetch run not started: %s", e, extra={'active_run_id': e.run_id})
+        raise
 
     except Exception as e:
-        # logging.critical(f"Unhandled exception: {e}", exc_info=True)
+        log.critical("Unhandled exception: %s", e, exc_info=True, extra={'run_id': run.run_id if run else None})
+        if run is not None:
+            # Configs left staged are picked up by the next run
+            run.finish(run_ledger.FAILED)
         notify_developers("Critical Error in fetch_update_convert.py", str(e))
         raise
 
     finally:
-        conn.close()
-        # logging.info("Connection closed")
-        print("Connection closed")
+        # Even a failed run may have committed some configs
+        invalidate_tables("STRL_PAYLOAD_MASTER", "STRL_QUEUE_CONFIG")
+        if digest is not None:
+            digest.send()
 
 if __name__ == "__main__":
     fetch_results_and_update_config()
-
-
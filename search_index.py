@@ -0,0 +1,227 @@
+# search_index.py
+
+import threading
+import time
+from collections import namedtuple
+
+from config import SEARCH_INDEX_TABLES, SEARCH_INDEX_REFRESH_INTERVAL, SEARCH_INDEX_REBUILD_EVERY
+from db_pool import pooled_connection
+from log_utils import get_logger
+
+log = get_logger('search_index')
+
+# Searchable column expressions per table (the same ones the ILIKE fallback uses),
+# and the column used to pick up changed rows on refresh (None means rebuild).
+SearchSpec = namedtuple('SearchSpec', ['table', 'columns', 'refresh_column'])
+
+SEARCH_SPECS = {
+    'STRL_SOURCE_MASTER': SearchSpec('STRL_SOURCE_MASTER', ('SOURCE_NAME', 'ID::TEXT'), 'LAST_UPDATED_DATETIME'),
+    'STRL_SCRIPT_MASTER': SearchSpec('STRL_SCRIPT_MASTER', ('SCRIPT_NAME', 'ID::TEXT'), 'LAST_UPDATED_DATETIME'),
+    'STRL_QUEUE_CONFIG': SearchSpec('STRL_QUEUE_CONFIG', ('SOURCE_NAME', 'SCRIPT_ID::TEXT'), 'LAST_UPDATED_DATETIME'),
+    'STRL_QUEUE_MASTER': SearchSpec('STRL_QUEUE_MASTER', ('QUEUE_NAME', 'ID::TEXT'), 'LAST_UPDATED_DATETIME'),
+    'STRL_PAYLOAD_MASTER': SearchSpec('STRL_PAYLOAD_MASTER', ('QUEUE_NAME', 'ID::TEXT'), 'LAST_UPDATED_DATETIME'),
+    'STRL_QUEUE_REPROCESS': SearchSpec('STRL_QUEUE_REPROCESS', ('CONFIG_ID::TEXT', 'SOURCE_ID::TEXT'), None),
+    'STRL_PRIORITY_LOG': SearchSpec('STRL_PRIORITY_LOG', ('CONFIG_ID::TEXT',), 'UPDATED_DATETIME'),
+}
+
+
+def trigrams(text):
+    """The set of 3-character substrings of a lower-cased value."""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def match_score(term, values):
+    """3 for an exact match, 2 for a prefix match, 1 for a substring match, 0 for no match."""
+    score = 0
+    for value in values:
+        if value == term:
+            return 3
+        if value.startswith(term):
+            score = max(score, 2)
+        elif term in value:
+            score = max(score, 1)
+    return score
+
+
+class TrigramIndex:
+    """
+    In-process trigram inverted index over one table's searchable columns.
+    A term of 3+ characters is resolved by intersecting the posting sets of its trigrams,
+    then verified as a real substring match; shorter terms scan the indexed values in memory.
+    """
+
+    def __init__(self, spec):
+        self.spec = spec
+        self._documents = {}  # ID -> tuple of lower-cased column values
+        self._postings = {}  # trigram -> set of IDs
+        self._high_water = None  # largest refresh_column value seen
+        self._max_id = None
+        self._last_refresh = None
+        self._refreshes = 0  # incremental refreshes since the last build
+        self._stale = True
+        self._lock = threading.RLock()
+
+    def _add(self, doc_id, values):
+        self._remove(doc_id)
+        self._documents[doc_id] = values
+        for gram in set().union(*(trigrams(value) for value in values)):
+            self._postings.setdefault(gram, set()).add(doc_id)
+
+    def _remove(self, doc_id):
+        values = self._documents.pop(doc_id, None)
+        if values is None:
+            return
+        for gram in set().union(*(trigrams(value) for value in values)):
+            posting = self._postings.get(gram)
+            if posting is not None:
+                posting.discard(doc_id)
+                if not posting:
+                    del self._postings[gram]
+
+    def _load(self, where='', params=()):
+        select_list = ", ".join(('ID',) + self.spec.columns + ((self.spec.refresh_column,) if self.spec.refresh_column else ()))
+        query = f"SELECT {select_list} FROM {self.spec.table}"
+        if where:
+            query += f" WHERE {where}"
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            cursor.close()
+        return rows
+
+    def _apply(self, rows):
+        width = len(self.spec.columns)
+        for row in rows:
+            doc_id = row[0]
+            self._add(doc_id, tuple('' if value is None else str(value).lower() for value in row[1:1 + width]))
+            if self._max_id is None or doc_id > self._max_id:
+                self._max_id = doc_id
+            if self.spec.refresh_column:
+                changed_at = row[1 + width]
+                if changed_at is not None and (self._high_water is None or changed_at > self._high_water):
+                    self._high_water = changed_at
+
+    def build(self):
+        """(Re)builds the whole index from the table."""
+        rows = self._load()
+        with self._lock:
+            self._documents, self._postings = {}, {}
+            self._high_water, self._max_id = None, None
+            self._apply(rows)
+            self._last_refresh = time.monotonic()
+            self._refreshes = 0
+            self._stale = False
+
+    def _count(self):
+        with pooled_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT COUNT(*) FROM {self.spec.table}")
+            count = cursor.fetchone()[0]
+            cursor.close()
+        return count
+
+    def refresh(self):
+        """
+        Applies rows changed since the last build/refresh. Deletions are not visible that way, so the
+        index is rebuilt instead when the table has no refresh column, on every SEARCH_INDEX_REBUILD_EVERY-th
+        refresh, and whenever the table's row count no longer matches the index.
+        """
+        if self._last_refresh is None or not self.spec.refresh_column or self._refreshes + 1 >= SEARCH_INDEX_REBUILD_EVERY:
+            self.build()
+            return
+        # Rows with no timestamp are only picked up when they are new (ID above the largest seen)
+        column = self.spec.refresh_column
+        if self._high_water is None:
+            rows = self._load("ID > %s", (self._max_id or 0,))
+        else:
+            rows = self._load(f"{column} >= %s OR ({column} IS NULL AND ID > %s)", (self._high_water, self._max_id or 0))
+        with self._lock:
+            self._apply(rows)
+            self._last_refresh = time.monotonic()
+            self._refreshes += 1
+            self._stale = False
+            indexed = len(self._documents)
+        if self._count() != indexed:
+            log.info("Search index for %s is out of step with the table; rebuilding", self.spec.table)
+            self.build()
+
+    def ensure_fresh(self):
+        with self._lock:
+            due = (
+                self._stale
+                or self._last_refresh is None
+                or time.monotonic() - self._last_refresh > SEARCH_INDEX_REFRESH_INTERVAL
+            )
+        if due:
+            self.refresh()
+
+    def mark_stale(self):
+        with self._lock:
+            self._stale = True
+
+    def remove(self, doc_id):
+        with self._lock:
+            self._remove(doc_id)
+
+    def search(self, term):
+        """Returns matching IDs ranked by match quality (exact, prefix, substring), then by ID."""
+        term = term.strip().lower()
+        if not term:
+            return []
+        self.ensure_fresh()
+        with self._lock:
+            if len(term) >= 3:
+                postings = sorted((self._postings.get(gram, set()) for gram in trigrams(term)), key=len)
+                candidates = set(postings[0]).intersection(*postings[1:]) if postings else set()
+            else:
+                candidates = self._documents.keys()
+            scored = []
+            for doc_id in candidates:
+                score = match_score(term, self._documents[doc_id])
+                if score:
+                    scored.append((-score, doc_id))
+        scored.sort()
+        return [doc_id for _, doc_id in scored]
+
+
+_indexes = {table: TrigramIndex(SEARCH_SPECS[table]) for table in SEARCH_INDEX_TABLES}
+
+
+def is_indexed(table):
+    return table in _indexes
+
+
+def search(table, term):
+    """Ranked IDs in `table` whose searchable columns contain `term` (case-insensitive)."""
+    return _indexes[table].search(term)
+
+
+def mark_stale(*tables):
+    """Makes the next search on these tables pick up recent writes first."""
+    for table in tables:
+        if table in _indexes:
+            _indexes[table].mark_stale()
+
+
+def remove(table, doc_id):
+    """
+    Drops a deleted row from this process's index at once; other processes drop it at their next
+    rebuild (see TrigramIndex.refresh).
+    """
+    if table in _indexes:
+        _indexes[table].remove(doc_id)
+
+
+def warm_in_background():
+    """Builds every configured index on a background thread so the first searches are served from memory."""
+    def warm():
+        for index in _indexes.values():
+            try:
+                index.build()
+            except Exception as e:
+                log.exception("Building search index for %s failed: %s", index.spec.table, e)
+
+    thread = threading.Thread(target=warm, name='search-index-warm', daemon=True)
+    thread.start()
+    return thread
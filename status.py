@@ -0,0 +1,78 @@
+# status.py
+
+from datetime import datetime, timezone
+
+# LIVE_PROCESS_STATUS values on STRL_QUEUE_CONFIG
+ASSIGN_PRIORITY_PENDING = 'Assign_priority_pending'
+PROCESSING = 'Processing'
+FETCHED = 'Fetched'
+ERROR = 'Error'
+
+# Allowed moves: a new config waits for a priority, then for a fetch run; a fetch either succeeds or fails.
+# Failed configs are re-fetched by the reprocess engine (Error -> Fetched / Error), and a fetched or failed
+# config is sent back to Processing when it has to be re-pulled (e.g. its query was edited).
+TRANSITIONS = {
+    ASSIGN_PRIORITY_PENDING: {PROCESSING},
+    PROCESSING: {FETCHED, ERROR},
+    FETCHED: {PROCESSING},
+    ERROR: {PROCESSING, FETCHED, ERROR},
+}
+
+# Configs in these states are picked up by the next fetch run. Errored configs are left to the
+# reprocess engine, which re-fetches them with backoff up to REPROCESS_MAX_RETRIES.
+FETCHABLE = (PROCESSING,)
+
+# PROCESS_STATUS values on STRL_QUEUE_MASTER batches
+BATCH_PENDING = 'Pending'
+BATCH_ERROR = 'Error'
+BATCH_DROPPED = 'Dropped'
+
+
+class InvalidTransition(ValueError):
+    """Raised when a status change is requested that the state machine does not allow."""
+
+    def __init__(self, from_status, to_status):
+        super().__init__(f"LIVE_PROCESS_STATUS cannot move from {from_status!r} to {to_status!r}")
+        self.from_status = from_status
+        self.to_status = to_status
+
+
+def sources_of(to_status):
+    """Every status that may move to `to_status`."""
+    return tuple(sorted(status for status, targets in TRANSITIONS.items() if to_status in targets))
+
+
+def transition(cursor, to_status, config_ids=None, from_statuses=None, set_columns=None):
+    """
+    Moves configs to `to_status` with one guarded UPDATE: only rows currently in an allowed source
+    state change, so a config that was moved concurrently is left alone. `config_ids=None` applies
+    to every config in a source state. `set_columns` ({column: value}) are written in the same UPDATE.
+    Stamps LIVE_PROCESS_STATUS_UPDATED_DATETIME and returns the number of configs that moved.
+    """
+    allowed = sources_of(to_status)
+    if not allowed:
+        raise InvalidTransition(None, to_status)
+    from_statuses = tuple(from_statuses) if from_statuses else allowed
+    for from_status in from_statuses:
+        if from_status not in allowed:
+            raise InvalidTransition(from_status, to_status)
+    if config_ids is not None:
+        config_ids = list(config_ids)
+        if not config_ids:
+            return 0
+
+    now = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+    assignments = {'LIVE_PROCESS_STATUS': to_status, 'LIVE_PROCESS_STATUS_UPDATED_DATETIME': now, 'LAST_UPDATED_DATETIME': now}
+    assignments.update(set_columns or {})
+
+    query = (
+        "UPDATE STRL_QUEUE_CONFIG SET " + ", ".join(f"{column} = %s" for column in assignments)
+        + " WHERE LIVE_PROCESS_STATUS IN (" + ", ".join(["%s"] * len(from_statuses)) + ")"
+    )
+    params = list(assignments.values()) + list(from_statuses)
+    if config_ids is not None:
+        query += " AND ID IN (" + ", ".join(["%s"] * len(config_ids)) + ")"
+        params += config_ids
+
+    cursor.execute(query, params)
+    return cursor.rowcount
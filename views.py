@@ -0,0 +1,83 @@
+# views.py
+
+from collections import namedtuple
+
+from db_pool import pooled_connection
+
+
+class View(namedtuple('View', ['name', 'table', 'columns', 'row_type'])):
+    """
+    The columns one page renders from a table. Rows come back as `row_type`, a namedtuple
+    whose fields are the lower-cased column names, so templates use row.priority instead of row[6].
+    """
+    __slots__ = ()
+
+    @property
+    def select_list(self):
+        return ", ".join(self.columns)
+
+
+def view(name, table, columns):
+    row_type = namedtuple(''.join(part.title() for part in name.split('_')) + 'Row', [column.lower() for column in columns])
+    return View(name, table, tuple(columns), row_type)
+
+
+# List pages. ID must come first: it is the keyset pagination cursor.
+SOURCE_MASTER_LIST = view('source_master_list', 'STRL_SOURCE_MASTER', [
+    'ID', 'SOURCE_NAME', 'SOURCE_DOMAIN', 'DESCRIPTION', 'MAXCOUNT_PER_DAY', 'IS_ACTIVE_STATUS',
+    'CREATED_BY', 'CREATED_USERID', 'CREATED_DATETIME', 'UPDATED_BY', 'UPDATED_USERID', 'LAST_UPDATED_DATETIME',
+])
+SCRIPT_MASTER_LIST = view('script_master_list', 'STRL_SCRIPT_MASTER', [
+    'ID', 'SOURCE_ID', 'SOURCE_CODE_PATH', 'SCRIPT_NAME', 'VERSION', 'DESCRIPTION', 'CREATED_BY',
+    'IS_ACTIVE_STATUS', 'DEPENDENCY_DESCRIPTION',
+])
+QUEUE_CONFIG_LIST = view('queue_config_list', 'STRL_QUEUE_CONFIG', [
+    'ID', 'SOURCE_NAME', 'QUERY_STRING', 'PRIORITY', 'FREQUENCY', 'START_DATE', 'IS_ACTIVE_STATUS',
+])
+QUEUE_MASTER_LIST = view('queue_master_list', 'STRL_QUEUE_MASTER', [
+    'ID', 'SOURCE_ID', 'SCRIPT_ID', 'SOURCE_NAME', 'QUEUE_NAME', 'QUEUE_DATE', 'QUEUE_TYPE', 'PRIORITY',
+])
+PAYLOAD_MASTER_LIST = view('payload_master_list', 'STRL_PAYLOAD_MASTER', [
+    'ID', 'SOURCE_ID', 'SCRIPT_ID', 'CONFIG_ID', 'QUEUE_MASTER_ID', 'QUEUE_NAME', 'PRIORITY', 'PAYLOAD_INPUT',
+])
+QUEUE_REPROCESS_LIST = view('queue_reprocess_list', 'STRL_QUEUE_REPROCESS', [
+    'ID', 'CONFIG_ID', 'SOURCE_ID', 'SCRIPT_ID', 'INPUT_DATA', 'FAIL_COUNT', 'LAST_FAILED_DATE',
+    'IS_RETRIED', 'RETRIED_DATE', 'ERROR_DETAILS',
+])
+PRIORITY_LOG_LIST = view('priority_log_list', 'STRL_PRIORITY_LOG', [
+    'ID', 'CONFIG_ID', 'OLD_PRIORITY', 'NEW_PRIORITY', 'UPDATED_BY', 'UPDATED_DATETIME',
+])
+
+# Edit pages
+SOURCE_EDIT = view('source_edit', 'STRL_SOURCE_MASTER', [
+    'ID', 'SOURCE_NAME', 'SOURCE_DOMAIN', 'DESCRIPTION', 'MAXCOUNT_PER_DAY', 'IS_ACTIVE_STATUS',
+])
+SCRIPT_EDIT = view('script_edit', 'STRL_SCRIPT_MASTER', [
+    'ID', 'SOURCE_ID', 'SOURCE_CODE_PATH', 'SCRIPT_NAME', 'VERSION', 'DESCRIPTION', 'IS_ACTIVE_STATUS',
+    'DEPENDENCY_DESCRIPTION',
+])
+QUEUE_CONFIG_EDIT = view('queue_config_edit', 'STRL_QUEUE_CONFIG', [
+    'ID', 'SCRIPT_ID', 'SOURCE_ID', 'SOURCE_NAME', 'QUERY_STRING', 'QUEUE_TYPE', 'PRIORITY', 'DESCRIPTION',
+    'FREQUENCY', 'CRON_LOGIC', 'MAXCOUNT_PER_DAY', 'START_DATE', 'END_DATE', 'IS_ACTIVE_STATUS',
+])
+QUEUE_MASTER_EDIT = view('queue_master_edit', 'STRL_QUEUE_MASTER', [
+    'ID', 'SOURCE_ID', 'SCRIPT_ID', 'SOURCE_NAME', 'QUEUE_NAME', 'QUEUE_DATE', 'QUEUE_TYPE', 'PRIORITY',
+    'PROCESS_STATUS', 'IS_QUEUED', 'IS_AGGREGATED', 'IS_PARSED', 'CREATED_BY', 'IS_DROPPED', 'DROPPED_DATE',
+    'INPUT_DATA_INDEX', 'ERROR_DETAILS', 'RETRY_COUNT',
+])
+
+
+def to_rows(view, rows):
+    """Wraps raw cursor tuples in the view's row type."""
+    make = view.row_type._make
+    return [make(row) for row in rows]
+
+
+def fetch_record(view, record_id):
+    """Fetches one record by ID with only the view's columns, or None if it does not exist."""
+    with pooled_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {view.select_list} FROM {view.table} WHERE ID = %s", (record_id,))
+        row = cursor.fetchone()
+        cursor.close()
+    return view.row_type._make(row) if row else None